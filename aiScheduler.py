@@ -0,0 +1,66 @@
+import time
+from settings import *
+
+
+# Spreads the expensive part of the NPC logic (the line of sight raycast and the path lookup, see
+# NPC.think) over frames. Every NPC gets a think interval from its state and its distance to the
+# player; each tick the NPCs that are due think, most overdue first, until the frame's time budget
+# is spent, and the rest wait for the next frame. The budget is started once per rendered frame
+# (begin_frame) and shared by all the ticks of that frame, so a frame catching up on several ticks
+# does not think for longer. Animation and acting on the last decision still run every tick for
+# every NPC.
+class AIScheduler:
+    def __init__(self, game):
+        self.game = game
+        self.enabled = AI_SCHEDULER
+        self.time = 0  # game time in milliseconds, advanced by delta_time
+        self.thinks = 0  # NPCs that thought in the last frame
+        self.deferred = 0  # due NPCs pushed to the next frame by the budget in the last frame
+        self.begin_frame()
+
+    # Starts the time budget of a frame and the counts stats reports for it.
+    def begin_frame(self):
+        self.deadline = time.perf_counter() + AI_FRAME_BUDGET / 1000
+        self.thinks = self.deferred = 0
+
+    # Returns the state the think interval is chosen by.
+    @staticmethod
+    def get_state(npc):
+        if not npc.isAlive:
+            return 'dead'
+        if npc.raycastValue:
+            return 'attacking' if npc.dist < npc.attackDistance else 'chasing'
+        return 'searching' if npc.playerSearch else 'idle'
+
+    # Returns the milliseconds until an NPC thinks again; far NPCs think less often.
+    def get_interval(self, npc):
+        if not self.enabled:
+            return 0
+        interval = AI_THINK_INTERVALS[self.get_state(npc)] * max(1, npc.dist / AI_NEAR_DISTANCE)
+        return min(interval, AI_MAX_THINK_INTERVAL)
+
+    # Lets the due NPCs think within the budget, then updates every NPC.
+    def update(self, npc_list):
+        self.think(npc_list)
+        for npc in npc_list:
+            npc.update()
+
+    # Lets the due NPCs think, most overdue first, until the frame's budget is spent.
+    def think(self, npc_list):
+        self.time += self.game.delta_time
+        now = self.time
+        due = sorted((npc for npc in npc_list if npc.next_think <= now and npc.isAlive),
+                     key=lambda npc: npc.next_think)
+        self.deferred = 0  # only the last tick's leftovers wait for the next frame
+        with self.game.profiler.span('AIScheduler.think'):
+            for count, npc in enumerate(due):
+                # at least one NPC thinks every frame, so a slow frame never starves them all
+                if self.enabled and self.thinks and time.perf_counter() > self.deadline:
+                    self.deferred = len(due) - count
+                    break
+                npc.think()
+                npc.next_think = now + self.get_interval(npc)
+                self.thinks += 1
+
+    def stats(self):
+        return {'thinks': self.thinks, 'deferred': self.deferred}
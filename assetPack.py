@@ -0,0 +1,174 @@
+import os
+
+if __name__ == '__main__':
+    # building and benchmarking the pack runs without a window or an audio device
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import json
+import mmap
+import struct
+import sys
+import time
+import pygame as pg
+from settings import *
+
+PACK_MAGIC = b'GMPK'
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct('<4sII')  # magic, version, index length
+PACK_ALIGN = 16
+
+
+# A pre-baked pack of every image the game loads, already scaled for one resolution and stored
+# as raw RGBA pixels. The file is memory-mapped and surfaces are built straight from its buffer.
+#
+# Layout: header (magic, version, index length), a JSON index holding the resolution, the size
+# and mtime of every source file and one entry per (path, size, smooth) key, then the pixel data.
+class AssetPack:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = PACK_HEADER.unpack_from(self.buffer, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a version {PACK_VERSION} asset pack')
+        index = json.loads(self.buffer[PACK_HEADER.size:PACK_HEADER.size + index_length])
+        self.resolution = tuple(index['resolution'])
+        self.sources = index['sources']
+        self.entries = {pack_key(entry): entry for entry in index['entries']}
+
+    # Opens the pack, or returns None when it is missing, unreadable or stale, so the caller
+    # falls back to the loose files.
+    @classmethod
+    def open(cls, path=ASSET_PACK_PATH):
+        if not os.path.exists(path):
+            return None
+        try:
+            pack = cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        if pack.is_stale():
+            pack.close()
+            return None
+        return pack
+
+    # A pack is stale when it was built for another resolution or a source file changed.
+    def is_stale(self):
+        if self.resolution != tuple(RES):
+            return True
+        for path, (size, mtime_ns) in self.sources.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return True
+            if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                return True
+        return False
+
+    # Returns the surface stored under an asset registry key, or None when it is not in the pack.
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        offset, length = entry['offset'], entry['length']
+        pixels = memoryview(self.buffer)[offset:offset + length]
+        return pg.image.frombuffer(pixels, (entry['width'], entry['height']), 'RGBA').convert_alpha()
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+
+def pack_key(entry):
+    size = entry['size']
+    return entry['path'], tuple(size) if size is not None else None, entry['smooth']
+
+
+# Writes the given asset registry surfaces to a pack file.
+def write_pack(surfaces, path=ASSET_PACK_PATH):
+    entries, blobs = [], []
+    for (source, size, smooth), surface in sorted(surfaces.items(), key=lambda item: repr(item[0])):
+        pixels = pg.image.tobytes(surface, 'RGBA')
+        entries.append({'path': source, 'size': size, 'smooth': smooth, 'width': surface.get_width(),
+                        'height': surface.get_height(), 'offset': 0, 'length': len(pixels)})
+        blobs.append(pixels)
+    sources = {}
+    for source in sorted({entry['path'] for entry in entries}):
+        stat = os.stat(source)
+        sources[source] = [stat.st_size, stat.st_mtime_ns]
+
+    # offsets depend on the index length, which depends on the offsets; grow it until both agree
+    index_length = 0
+    while True:
+        offset = align(PACK_HEADER.size + index_length)
+        for entry, pixels in zip(entries, blobs):
+            entry['offset'] = offset
+            offset = align(offset + len(pixels))
+        index = json.dumps({'resolution': list(RES), 'sources': sources, 'entries': entries}).encode()
+        if len(index) <= index_length:
+            break
+        index_length = len(index) + 4 * len(entries)
+    index = index.ljust(index_length)
+
+    with open(path, 'wb') as file:
+        file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, index_length))
+        file.write(index)
+        for entry, pixels in zip(entries, blobs):
+            file.write(b'\0' * (entry['offset'] - file.tell()))
+            file.write(pixels)
+    return len(entries)
+
+
+def align(offset):
+    return -(-offset // PACK_ALIGN) * PACK_ALIGN
+
+
+# Loads everything a game uses into an asset registry: a level, every NPC type and the menus.
+def load_game_assets(pack=None):
+    from main import Game
+    from assetRegistry import AssetRegistry
+    game = Game.__new__(Game)
+    game.screen = pg.display.get_surface() or pg.display.set_mode(RES)
+    game.assets = AssetRegistry(pack)
+    game.assets.acquire('resources/opening.png', 'ui')
+    game.assets.acquire('resources/cross.png', 'ui')
+    game.new_game(1, 1)
+    for npc_type in game.entity_manager.npc_types:
+        npc_type(game)
+    return game.assets
+
+
+# Builds the pack for the current resolution from the loose files.
+def build(path=ASSET_PACK_PATH):
+    pg.init()
+    assets = load_game_assets()
+    count = write_pack(assets.surfaces, path)
+    print(f'wrote {count} images for {WIDTH}x{HEIGHT} to {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)')
+
+
+# Times loading every asset from the loose files and from the pack, twice each: the first
+# (cold) run fills the OS file cache, the second (warm) run reads from it.
+def benchmark(path=ASSET_PACK_PATH):
+    pg.init()
+    results = {}
+    for source in ('loose', 'pack'):
+        for run in ('cold', 'warm'):
+            start = time.perf_counter()
+            pack = AssetPack.open(path) if source == 'pack' else None
+            if source == 'pack' and pack is None:
+                print(f'{path} is missing or stale, run "python assetPack.py build" first')
+                return
+            load_game_assets(pack)
+            results[f'{source}_{run}_ms'] = (time.perf_counter() - start) * 1000
+            if pack is not None:
+                pack.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    commands = {'build': build, 'bench': benchmark}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print('usage: python assetPack.py build|bench [pack path]')
+        sys.exit(1)
+    commands[sys.argv[1]](*sys.argv[2:])
@@ -0,0 +1,127 @@
+import pygame as pg
+import os
+from concurrent.futures import ThreadPoolExecutor
+from settings import *
+
+
+# Loads every image of the game once and shares the surface between all its users.
+# Surfaces are keyed by (path, size, smooth), so each scaled variant is also made only once,
+# and are reference counted: release() drops a surface when its last user lets go of it.
+# Pixel memory is accounted per category (texture, sprite, npc, weapon, ui).
+# When an asset pack is given, images are taken from it instead of the loose files.
+# Images can be preloaded: decoded and scaled on a worker pool ahead of time (e.g. while the
+# menus are shown), leaving only the conversion to the display format for acquire().
+class AssetRegistry:
+    def __init__(self, pack=None):
+        self.pack = pack
+        self.surfaces = {}
+        self.refcounts = {}
+        self.categories = {}
+        self.keys = {}  # id(surface) -> key
+        self.listings = {}
+        self.pending = {}  # key -> future of a preloaded, not yet converted surface
+        self.executor = None
+        self.loads = 0  # image files decoded, counted on the main thread as the decodes are used
+
+    # Returns the shared surface for an image file, scaled to size when given.
+    def acquire(self, path, category='misc', size=None, smooth=False):
+        key = path, tuple(size) if size is not None else None, smooth
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.load(*key)
+            self.surfaces[key] = surface
+            self.refcounts[key] = 0
+            self.categories[key] = category
+            self.keys[id(surface)] = key
+        self.refcounts[key] += 1
+        return surface
+
+    # Returns the shared frames of every image file in a directory, in directory listing order.
+    def acquire_frames(self, directory, category='misc', size=None, smooth=False):
+        return [self.acquire(path, category, size, smooth) for path in self.list_images(directory)]
+
+    # Decodes an image file and converts it to the display format. Scaled variants reuse the
+    # unscaled surface when it is already held, instead of decoding the file again.
+    def load(self, path, size, smooth):
+        if self.pack is not None:
+            surface = self.pack.get((path, size, smooth))
+            if surface is not None:
+                return surface
+        future = self.pending.pop((path, size, smooth), None)
+        if future is not None:
+            self.loads += 1
+            return future.result().convert_alpha()
+        surface = self.surfaces.get((path, None, False))
+        if surface is None:
+            future = self.pending.pop((path, None, False), None)
+            surface = future.result() if future is not None else self.decode(path)
+            surface = surface.convert_alpha()
+            self.loads += 1
+        if size is not None:
+            scale = pg.transform.smoothscale if smooth else pg.transform.scale
+            surface = scale(surface, size)
+        return surface
+
+    # Decodes and scales an image; runs on the preload workers, so it does not touch the display
+    # or any shared state.
+    def decode(self, path, size=None, smooth=False):
+        surface = pg.image.load(path)
+        if size is not None:
+            scale = pg.transform.smoothscale if smooth else pg.transform.scale
+            surface = scale(surface, size)
+        return surface
+
+    # Starts decoding (path, size, smooth) keys on the worker pool. Nothing is preloaded when an
+    # asset pack is used, since reading from the pack is already cheaper than a worker round trip.
+    def preload(self, keys):
+        if self.pack is not None:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(ASSET_PRELOAD_WORKERS, thread_name_prefix='asset-preload')
+        for path, size, smooth in keys:
+            key = path, tuple(size) if size is not None else None, smooth
+            if key not in self.surfaces and key not in self.pending:
+                self.pending[key] = self.executor.submit(self.decode, *key)
+
+    def preload_frames(self, directory, size=None, smooth=False):
+        self.preload((path, size, smooth) for path in self.list_images(directory))
+
+    # Drops the preloads of the images in a directory that turned out not to be needed.
+    def cancel_preload(self, directory):
+        for key in [key for key in self.pending if os.path.dirname(key[0]) == directory]:
+            if not self.pending.pop(key).cancel():
+                self.loads += 1  # already decoding or decoded
+
+    def list_images(self, directory):
+        paths = self.listings.get(directory)
+        if paths is None:
+            paths = [directory + '/' + file_name for file_name in os.listdir(directory)
+                     if os.path.isfile(os.path.join(directory, file_name))]
+            self.listings[directory] = paths
+        return paths
+
+    # Gives back one reference to a surface and forgets it once nobody uses it.
+    def release(self, surface):
+        key = self.keys.get(id(surface))
+        if key is None:
+            return
+        self.refcounts[key] -= 1
+        if self.refcounts[key] <= 0:
+            del self.surfaces[key], self.refcounts[key], self.categories[key], self.keys[id(surface)]
+
+    def release_all(self, surfaces):
+        for surface in surfaces:
+            self.release(surface)
+
+    # Returns the pixel memory in bytes and the number of surfaces held per category.
+    def memory_report(self):
+        report = {}
+        for key, surface in self.surfaces.items():
+            entry = report.setdefault(self.categories[key], {'bytes': 0, 'surfaces': 0})
+            entry['bytes'] += surface.get_width() * surface.get_height() * surface.get_bytesize()
+            entry['surfaces'] += 1
+        report['total'] = {
+            'bytes': sum(entry['bytes'] for entry in report.values()),
+            'surfaces': len(self.surfaces),
+        }
+        return report
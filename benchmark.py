@@ -0,0 +1,211 @@
+import os
+
+# run without a window or an audio device unless the caller asks for real drivers
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import random
+import time
+import pygame as pg
+from settings import *
+from main import Game
+from profiler import Profiler
+from mapGenerator import MAP_KINDS, parse_map_spec, is_generated_map
+
+# default scripted path: walk forward, strafe while turning, back up and fire now and then
+DEFAULT_SCRIPT = [
+    {'frames': 90, 'keys': 'w', 'turn': 0, 'fire': False},
+    {'frames': 60, 'keys': '', 'turn': 20, 'fire': True},
+    {'frames': 90, 'keys': 'wd', 'turn': -10, 'fire': False},
+    {'frames': 60, 'keys': 's', 'turn': 30, 'fire': True},
+    {'frames': 90, 'keys': 'wa', 'turn': 5, 'fire': False},
+]
+
+KEYS = {'w': pg.K_w, 'a': pg.K_a, 's': pg.K_s, 'd': pg.K_d}
+
+
+# Pressed keys of a scripted step, indexable by pygame key constants like pg.key.get_pressed().
+class ScriptedKeys:
+    def __init__(self, keys):
+        self.pressed = {KEYS[key] for key in keys}
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+# Replays a list of steps, each holding keys, a mouse turn and a fire flag for a number of frames.
+# The script loops when it runs out of steps.
+class ScriptedInput:
+    def __init__(self, script):
+        self.steps = [(step['frames'], ScriptedKeys(step.get('keys', '')), step.get('turn', 0),
+                       step.get('fire', False)) for step in script]
+        self.step = 0
+        self.frame = 0
+        self.rel = self.steps[0][2]  # mouse motion not read yet
+
+    # Moves to the next frame of the script.
+    def advance(self):
+        self.frame += 1
+        if self.frame >= self.steps[self.step][0]:
+            self.frame = 0
+            self.step = (self.step + 1) % len(self.steps)
+        self.rel += self.steps[self.step][2]
+
+    def get_pressed(self):
+        return self.steps[self.step][1]
+
+    # Returns the mouse motion since the last call, like pg.mouse.get_rel: a frame's turn is read by the
+    # first tick after it, and frames that run no tick carry their turn over to the next one.
+    def get_rel(self):
+        rel, self.rel = self.rel, 0
+        return rel, 0
+
+    # Returns the mouse click of this frame, if the step fires.
+    def get_events(self):
+        if self.steps[self.step][3]:
+            return [pg.event.Event(pg.MOUSEBUTTONDOWN, button=1, pos=(HALF_WIDTH, HALF_HEIGHT))]
+        return []
+
+
+# Stands in for the game's profiler and keeps every span sample while recording, so the benchmark
+# times the same spans Game.update and Game.draw run: once per tick for the simulation spans
+# (Game.tick and the updates in it), once per frame for the rendering ones.
+class SpanRecorder(Profiler):
+    def __init__(self):
+        super().__init__()
+        self.enabled = True
+        self.recording = False
+        self.timings = {}
+
+    def record(self, name, start, duration):
+        if self.recording:
+            self.timings.setdefault(name, []).append(duration / 1e6)
+
+
+# Returns the p50/p95/p99, mean and max of a list of timings in milliseconds.
+def summarize(samples):
+    samples = sorted(samples)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+    return {
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'p99': percentile(99),
+        'mean': sum(samples) / len(samples),
+        'max': samples[-1],
+    }
+
+
+# Runs the game loop (Game.update and Game.draw) for a number of frames with scripted input, each frame
+# taking frame_time real milliseconds, and times every span. The simulation runs its fixed ticks of
+# SIM_TICK_TIME milliseconds from the accumulated frame time, as in the game, so a frame time other
+# than SIM_TICK_TIME runs several ticks or none per frame and draws interpolated poses.
+# The player is healed before each frame so the run never stops at the game over screen.
+def run_benchmark(map_choice=1, difficulty_choice=1, seed=0, frames=600, frame_time=SIM_TICK_TIME, script=None, warmup=30):
+    random.seed(seed)
+    game = Game(map_choice, difficulty_choice)
+    scripted_input = ScriptedInput(script or DEFAULT_SCRIPT)
+    game.scripted_input = scripted_input
+    recorder = game.profiler = SpanRecorder()
+    frame_times, ticks = [], []
+
+    for frame in range(warmup + frames):
+        game.frame_time = frame_time
+        game.player.health = PLAYER_MAX_HEALTH
+        pg.event.pump()
+        for event in scripted_input.get_events():
+            game.player.single_fire_event(event)
+
+        recorder.recording = frame >= warmup
+        frame_start = time.perf_counter()
+        game.update()
+        game.draw()
+        if recorder.recording:
+            frame_times.append((time.perf_counter() - frame_start) * 1000)
+            ticks.append(game.ticks)
+        scripted_input.advance()
+
+    return {
+        'config': {
+            'map': map_choice,
+            'difficulty': difficulty_choice,
+            'seed': seed,
+            'frames': frames,
+            'warmup': warmup,
+            'frame_time': frame_time,
+            'tick_time': SIM_TICK_TIME,
+            'resolution': list(RES),
+            'num_rays': NUM_RAYS,
+            'raycast_backend': game.raycasting.backend,
+            'wall_renderer': WALL_RENDERER,
+            'pathfinding': game.pathfinding.mode,
+            'npc_backend': 'objects' if game.entity_manager.npc_arrays is None else 'worker' if NPC_WORKER else 'arrays',
+        },
+        'system': {
+            'python': platform.python_version(),
+            'pygame': pg.version.ver,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'system': platform.system(),
+        },
+        'frame_ms': summarize(frame_times),
+        'ticks_per_frame': summarize(ticks),
+        'stages_ms': {name: summarize(samples) for name, samples in recorder.timings.items()},
+        'assets': game.assets.memory_report(),
+        'path_cache': game.pathfinding.path_cache.stats(),
+        'ai_scheduler': game.entity_manager.scheduler.stats(),
+        'world': game.world.stats(),
+        'spawner': game.entity_manager.spawner.stats(),
+    }
+
+
+# Returns a built-in map number, or a procedural map number after checking it.
+def parse_map_choice(value):
+    if not is_generated_map(value):
+        if value not in ('1', '2'):
+            raise argparse.ArgumentTypeError('the built-in maps are 1 and 2')
+        return int(value)
+    try:
+        spec = parse_map_spec(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a map like 'rooms:256x256:7', got {value!r}")
+    if spec['kind'] not in MAP_KINDS:
+        raise argparse.ArgumentTypeError(f'unknown map kind {spec["kind"]!r}')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless frame benchmark with scripted input.')
+    parser.add_argument('--map', type=parse_map_choice, default=1,
+                        help="1, 2 or a procedural map like 'rooms:256x256:7' (see mapGenerator.py)")
+    parser.add_argument('--difficulty', type=int, default=1, choices=(1, 2))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--frame-time', type=float, default=SIM_TICK_TIME,
+                        help='real milliseconds each frame takes; the simulation runs fixed ticks of SIM_TICK_TIME')
+    parser.add_argument('--script', help='JSON file with a list of {frames, keys, turn, fire} steps')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as file:
+            script = json.load(file)
+    report = run_benchmark(args.map, args.difficulty, args.seed, args.frames, args.frame_time, script, args.warmup)
+    pg.quit()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,18 @@
 from spriteEntity import *
 from npc import *
-from random import choices, randrange
+from aiScheduler import AIScheduler
+from spatialIndex import SpatialGrid
+from npcArrays import NPCArrays
+from npcWorker import NPCWorker
+from spawnSystem import SpawnSystem
 
 # manages the creation, update, and interactions of sprites and NPCs in the game.
 class EntityManager:
+    npc_sprite_path = 'resources/sprites/npc/'
+    static_sprite_path = 'resources/sprites/static_sprites/'
+    anim_sprite_path = 'resources/sprites/animated_sprites/'
+    all_npc_types = (RangeNPC, MeleeNPC, BossNPC)
+
     #  Initializes the object with the game instance and the chosen difficulty level.
     #  It sets up the paths for different types of sprites, initializes sprite and NPC lists, and spawns NPCs based on the chosen difficulty.
     def __init__(self,game, difficulty_choice):
@@ -11,80 +20,137 @@ class EntityManager:
         self.sprite_list = []
         self.npc_list = []
 
-
-        self.npc_sprite_path = 'resources/sprites/npc/'
-        self.static_sprite_path = 'resources/sprites/static_sprites/'
-        self.anim_sprite_path = 'resources/sprites/animated_sprites/'
         add_sprite = self.add_sprite
         add_npc = self.add_npc
-        self.npc_positions = {}
+        self.spatial_index = SpatialGrid(game.map.cols, game.map.rows)
+        self.npc_positions = self.spatial_index.occupied  # tiles of the living NPCs, kept up to date by the index
+        self.shot_targets = set()
+        self.scheduler = AIScheduler(game)
+        # NPC storage backend: None keeps one NPC object per NPC, see NPCArrays and NPCWorker
+        self.npc_arrays = None
+        if NPC_BACKEND == 'arrays' and NPCArrays.supported:
+            self.npc_arrays = NPCWorker(game) if NPC_WORKER else NPCArrays(game)
 
         # spawn npc
         if(difficulty_choice==1):
             self.enemies = 10  # npc count
             self.npc_types = [RangeNPC, MeleeNPC, BossNPC]
             self.weights = [60, 30, 10]
-            self.restricted_area = {(i, j) for i in range(10) for j in range(10)}
-            self.spawn_npc()
         if (difficulty_choice == 2):
             self.enemies = 20  # npc count
             self.npc_types = [RangeNPC, MeleeNPC, BossNPC]
             self.weights = [60, 30, 10]
-            self.restricted_area = {(i, j) for i in range(10) for j in range(10)}
-            self.spawn_npc()
-
-        # sprite map
-        add_sprite(spriteAnimator(game))
-        add_sprite(spriteAnimator(game, pos=(1.5, 1.5)))
-        add_sprite(spriteAnimator(game, pos=(1.5, 7.5)))
-        add_sprite(spriteAnimator(game, pos=(5.5, 3.25)))
-        add_sprite(spriteAnimator(game, pos=(5.5, 4.75)))
-        add_sprite(spriteAnimator(game, pos=(7.5, 2.5)))
-        add_sprite(spriteAnimator(game, pos=(7.5, 5.5)))
-        add_sprite(spriteAnimator(game, pos=(14.5, 1.5)))
-        add_sprite(spriteAnimator(game, pos=(14.5, 4.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(14.5, 5.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(14.5, 7.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(12.5, 7.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(9.5, 7.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(14.5, 12.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(9.5, 20.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(10.5, 20.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(3.5, 14.5)))
-        add_sprite(spriteAnimator(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(3.5, 18.5)))
-        add_sprite(spriteAnimator(game, pos=(14.5, 24.5)))
-        add_sprite(spriteAnimator(game, pos=(14.5, 30.5)))
-        add_sprite(spriteAnimator(game, pos=(1.5, 30.5)))
-        add_sprite(spriteAnimator(game, pos=(1.5, 24.5)))
+        self.spawner = SpawnSystem(game, self)
+        self.spawn_npc()
+
+        # sprite map, from the map file; the sprites are created per resident chunk (see load_chunk)
+        self.placements = {}  # chunk -> (sprite class, path, pos) of its sprites
+        self.chunk_sprites = {}  # resident chunk -> its sprites
+        for name, x, y in game.map.lights:
+            self.placements.setdefault(game.world.get_chunk(x, y), []).append(
+                (spriteAnimator, self.anim_sprite_path + name + '/0.png', (x, y)))
+        for name, x, y in game.map.sprites:
+            self.placements.setdefault(game.world.get_chunk(x, y), []).append(
+                (SpriteObject, self.static_sprite_path + name + '.png', (x, y)))
+        game.world.add_listener(self)
 
     # Spawns NPCs in the game world based on the chosen difficulty.
-    # It randomly selects NPC types with weighted probabilities and assigns them to random positions on the game map, considering restricted areas.
+    # It randomly selects NPC types with weighted probabilities and queues them on the spawn system, which places them on
+    # random spawn tiles of the map over the next ticks (the first SPAWN_PER_TICK right away).
+    # The NPC types are drawn up front, so the preloaded frames of types that are not spawned are dropped;
+    # with spawn waves every type may still come, so nothing is dropped then.
     def spawn_npc(self):
-        for i in range(self.enemies):
-                npc = choices(self.npc_types, self.weights)[0]
-                pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
-                while (pos in self.game.map.world_map) or (pos in self.restricted_area):
-                    pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
-                self.add_npc(npc(self.game, pos=(x + 0.5, y + 0.5)))
-
-    # Checks if all NPCs have been eliminated and declare a win state
+        spawned_types = self.spawner.draw_types(self.enemies)
+        if not SPAWN_WAVES:
+            for npc_type in set(self.all_npc_types) - set(spawned_types):
+                for directory in npc_type.frame_dirs():
+                    self.game.assets.cancel_preload(directory)
+        self.spawner.queue(spawned_types)
+        self.spawner.spawn(SPAWN_PER_TICK)
+
+    # Starts decoding the light and NPC frames in the background, before a level is built.
+    @classmethod
+    def preload(cls, assets):
+        assets.preload_frames(cls.anim_sprite_path + 'green_light')
+        assets.preload_frames(cls.anim_sprite_path + 'red_light')
+        for npc_type in cls.all_npc_types:
+            for directory in npc_type.frame_dirs():
+                assets.preload_frames(directory)
+
+    # Bumped only when npc_positions really changes.
+    @property
+    def occupancy_version(self):
+        return self.spatial_index.version
+
+    # Checks if all NPCs have been eliminated and no more are coming, and declare a win state
     def check_win(self):
-        if not len(self.npc_positions):
+        if not self.spatial_index.alive and self.spawner.done:
             self.game.object_renderer.win()
             pg.display.flip()
             pg.time.delay(1500)
             self.game.new_game(self.game.map_choice, self.game.difficulty_choice)
 
-    # updates NPCs positions, animations, and checks for win conditions.
+    # Creates the sprites of a chunk that became resident.
+    def load_chunk(self, chunk):
+        sprites = [sprite_type(self.game, path=path, pos=pos) for sprite_type, path, pos in self.placements.get(chunk, ())]
+        if sprites:
+            self.chunk_sprites[chunk] = sprites
+            self.sprite_list.extend(sprites)
+
+    # Releases the sprites of a chunk that was paged out.
+    def unload_chunk(self, chunk):
+        sprites = set(self.chunk_sprites.pop(chunk, ()))
+        if sprites:
+            self.sprite_list = [sprite for sprite in self.sprite_list if sprite not in sprites]
+            for sprite in sprites:
+                sprite.release()
+
+    # updates NPCs animations and logic, and checks for win conditions, once per simulation tick.
+    # NPC positions are tracked by the spatial index as the NPCs move. Only the NPCs in the simulated
+    # chunks of the world are updated, the rest are frozen.
     def update(self):
-        self.npc_positions = {npc.map_pos for npc in self.npc_list if npc.isAlive}
-        [sprite.update() for sprite in self.sprite_list]
-        [npc.update() for npc in self.npc_list]
+        self.game.world.update()
+        self.spawner.update()
+        self.shot_targets = self.get_shot_targets()
+        if self.npc_arrays is None:
+            simulated, _ = self.game.world.split(self.npc_list)
+            self.scheduler.update(simulated)
+        else:
+            self.npc_arrays.update()
         self.check_win()
 
-    # Adds an NPC to the NPC list.
+    # Projects the sprites and the resident NPCs for the frame being rendered, from the player's render
+    # pose (see Game.draw); animated sprites also step their animation here.
+    def project(self):
+        [sprite.update() for sprite in self.sprite_list]
+        if self.npc_arrays is None:
+            simulated, resident = self.game.world.split(self.npc_list)
+            for npc in simulated + resident:
+                npc.getSprite()
+        else:
+            self.npc_arrays.project()
+
+    # Returns the living NPCs close enough to the line of fire to be hit by the player's shot this tick.
+    def get_shot_targets(self):
+        player = self.game.player
+        if not player.shot:
+            return set()
+        length = math.hypot(self.game.map.cols, self.game.map.rows)
+        return set(self.spatial_index.query_ray(player.pos, player.angle, length, SHOT_RADIUS))
+
+    # Releases the shared images of all sprites and NPCs, when the level is replaced.
+    def release(self):
+        for sprite in self.sprite_list + self.npc_list:
+            sprite.release()
+        if self.npc_arrays is not None:
+            self.npc_arrays.release()
+
+    # Adds an NPC to the NPC list; with the arrays backend its view is added in its place.
     def add_npc(self, npc):
+        if self.npc_arrays is not None:
+            npc = self.npc_arrays.add(npc)
         self.npc_list.append(npc)
+        self.spatial_index.add(npc)
 
     # Adds a sprite to the sprite list
     def add_sprite(self, sprite):
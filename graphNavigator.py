@@ -1,20 +1,85 @@
 from collections import deque
+from settings import *
+from gridPathfinder import AStarPathfinder, ClusterPathfinder
+from lruCache import LRUCache
 
 
 #  handles pathfinding operations within the game.
 # It uses a breadth-first search (BFS) algorithm to find the shortest path from a start position to a goal position on a map.
+# In 'flowfield' mode a single BFS from the goal (the player's tile) is shared by all NPCs instead,
+# in 'astar' mode each NPC runs an A* search on the array grid of AStarPathfinder and in 'hpa' mode
+# a search on the cluster graph of ClusterPathfinder.
 class GraphNavigator:
     # Initializes the object by getting the game instance as a parameter
     def __init__(self, game):
         self.game = game
         self.map = game.map.mini_map # Retrieves the mini-map from the game's map.
         self.ways = [-1, 0], [0, -1], [1, 0], [0, 1], [-1, -1], [1, -1], [1, 1], [-1, 1]  # Defines the possible movement directions (ways) as offsets in the x and y directions.
-        self.graph = {}
-        self.get_graph()
+        self.graph = {}  # built per resident chunk of game.world, see load_chunk
+        self.map_version = game.map.version
+        self.mode = PATHFINDING_MODE
+        # the A* grid and the cluster graph cover the whole map, so they are only built when used
+        self.astar = AStarPathfinder(self.map) if self.mode in ('astar', 'hpa') else None
+        self.hpa = ClusterPathfinder(self.astar) if self.mode == 'hpa' else None
+        self.flow_goal = None
+        self.flow_distance = {}  # tile -> number of steps to flow_goal
+        self.path_cache = PathCache()
+        game.world.add_listener(self)
 
-    # Computes and returns the shortest path from the start position to the goal position using the breadth-first search algorithm.
+    # Returns the next tile to move to from start towards goal. Search results are cached per
+    # (start, goal) for as long as neither the walls, the tiles occupied by NPCs nor the loaded chunks
+    # change. Flow field steps are not: reading the shared field is as cheap as the cache lookup.
     def get_path(self, start, goal):
-        self.visited = self.bfs(start, goal, self.graph) # Utilizes the bfs method to perform the actual search.
+        if self.map_version != self.game.map.version:
+            self.refresh()
+        if self.mode == 'flowfield':
+            return self.get_flow_step(start, goal)
+        version = self.map_version, self.game.entity_manager.occupancy_version, self.game.world.version
+        step = self.path_cache.lookup((start, goal), version)
+        if step is None:
+            step = self.path_cache.store((start, goal), version, self.find_next_step(start, goal))
+        return step
+
+    # Runs the search of the current mode.
+    def find_next_step(self, start, goal):
+        if self.mode == 'astar':
+            with self.game.profiler.span('GraphNavigator.astar'):
+                return self.astar.next_step(start, goal, self.game.entity_manager.npc_positions)
+        if self.mode == 'hpa':
+            with self.game.profiler.span('GraphNavigator.hpa'):
+                return self.hpa.next_step(start, goal, self.game.entity_manager.npc_positions)
+        return self.get_bfs_path(start, goal)
+
+    # Updates the graph and the grids around the tiles changed since the last query (everything when
+    # the map no longer remembers them all) and drops the flow field.
+    def refresh(self):
+        changes = self.game.map.changes_since(self.map_version)
+        if changes is None:
+            self.graph = {}
+            self.get_graph()
+            if self.astar is not None:
+                self.astar.load(self.map)
+            if self.hpa is not None:
+                self.hpa.build()
+        for x, y in changes or ():
+            if self.astar is not None:
+                self.astar.set_tile(x, y, self.map[y][x])
+            if self.hpa is not None:
+                self.hpa.invalidate(x, y)
+            for dx, dy in [0, 0], *self.ways:
+                node = x + dx, y + dy
+                if node in self.graph or node == (x, y) and self.game.world.is_resident(x, y):
+                    if self.map[node[1]][node[0]]:
+                        self.graph.pop(node, None)
+                    else:
+                        self.graph[node] = self.get_next_nodes(*node)
+        self.flow_goal = None
+        self.map_version = self.game.map.version
+
+    # Computes and returns the shortest path from the start position to the goal position using the breadth-first search algorithm.
+    def get_bfs_path(self, start, goal):
+        with self.game.profiler.span('GraphNavigator.bfs'):
+            self.visited = self.bfs(start, goal, self.graph) # Utilizes the bfs method to perform the actual search.
         path = [goal]
         step = self.visited.get(goal, start)
 
@@ -33,7 +98,7 @@ class GraphNavigator:
             cur_node = queue.popleft()
             if cur_node == goal: # Stops the search when the goal node is reached.
                 break
-            next_nodes = graph[cur_node]
+            next_nodes = graph.get(cur_node, ())  # the search stops at the resident chunks
 
             # Excludes nodes that are occupied by NPCs (non-playable characters).
             for next_node in next_nodes:
@@ -42,18 +107,95 @@ class GraphNavigator:
                     visited[next_node] = cur_node
         return visited
 
+    # Builds the flow field: the step distance from every reachable tile to the goal.
+    # It is rebuilt only when the goal (the player's tile) changes; refresh() drops it on map changes.
+    def update_flow_field(self, goal):
+        if goal == self.flow_goal:
+            return
+        with self.game.profiler.span('GraphNavigator.flow_field'):
+            distance = {goal: 0}
+            queue = deque([goal])
+            while queue:
+                cur_node = queue.popleft()
+                next_distance = distance[cur_node] + 1
+                for next_node in self.graph.get(cur_node, ()):
+                    if next_node not in distance:
+                        distance[next_node] = next_distance
+                        queue.append(next_node)
+            self.flow_distance = distance
+            self.flow_goal = goal
+
+    # Reads the next step from the flow field: the neighbour closest to the goal.
+    # Tiles occupied by other NPCs are not searched around; they only cost FLOW_OCCUPIED_COST extra
+    # steps, so an NPC steps aside or waits instead of walking into another one.
+    def get_flow_step(self, start, goal):
+        self.update_flow_field(goal)
+        distance = self.flow_distance
+        if start == goal or start not in distance:
+            return goal
+        npc_positions = self.game.entity_manager.npc_positions
+        best_node, best_cost = goal, None
+        for next_node in self.graph.get(start, ()):
+            cost = distance.get(next_node)
+            if cost is None:
+                continue
+            if next_node != goal and next_node in npc_positions:
+                cost += FLOW_OCCUPIED_COST
+            if best_cost is None or cost < best_cost:
+                best_node, best_cost = next_node, cost
+        return best_node
+
     # Computes and returns a list of adjacent nodes (next nodes) for a given position (x, y).
     # Considers the possible movement directions (ways) and checks if the resulting adjacent nodes are not obstacles on the map.
     def get_next_nodes(self, x, y):
-        return [(x + dx, y + dy) for dx, dy in self.ways if (x + dx, y + dy) not in self.game.map.world_map]
+        is_wall = self.game.map.is_wall
+        return [(x + dx, y + dy) for dx, dy in self.ways if not is_wall(x + dx, y + dy)]
 
-    # Constructs the graph representation of the map by iterating over each position (x, y) in the mini-map.
+    # Constructs the graph representation of the resident part of the map.
     def get_graph(self):
-        # For each empty position, adds its adjacent nodes (next nodes) to the graph using the get_next_nodes method.
-        for y, row in enumerate(self.map):
-            for x, col in enumerate(row):
-                if not col:
-                    self.graph[(x, y)] = self.graph.get((x, y), []) + self.get_next_nodes(x, y)
+        for chunk in self.game.world.resident:
+            self.load_chunk(chunk)
+
+    # Adds the free tiles of a chunk to the graph, with their adjacent nodes.
+    # Edges may lead into chunks that are not loaded; searches simply end there.
+    def load_chunk(self, chunk):
+        left, top, right, bottom = self.game.world.get_bounds(chunk)
+        for y in range(top, bottom):
+            row = self.map[y]
+            for x in range(left, right):
+                if not row[x]:
+                    self.graph[(x, y)] = self.get_next_nodes(x, y)
+        self.flow_goal = None
+
+    def unload_chunk(self, chunk):
+        left, top, right, bottom = self.game.world.get_bounds(chunk)
+        for y in range(top, bottom):
+            for x in range(left, right):
+                self.graph.pop((x, y), None)
+        self.flow_goal = None
+
+
+# Caches next steps by (start, goal). Entries are tagged with the version of the walls and the NPC
+# occupancy they were computed for; an entry from an older version counts as a miss.
+class PathCache(LRUCache):
+    def __init__(self, max_size=PATH_CACHE_SIZE):
+        super().__init__(max_size)
+        self.stale = 0
+
+    # Returns the cached step for a key computed at this version, or None after counting a miss.
+    def lookup(self, key, version):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            self.stale += entry is not None
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
 
+    def store(self, key, version, step):
+        super().store(key, (version, step))
+        return step
 
-                    
\ No newline at end of file
+    def stats(self):
+        return {**super().stats(), 'stale': self.stale}
@@ -0,0 +1,422 @@
+import heapq
+import math
+import random
+import time
+from types import SimpleNamespace
+from settings import *
+
+SQRT2 = math.sqrt(2)
+
+
+# A* search over a flat array grid: one bytearray cell per tile, indexed y * width + x, with a
+# border of walls around the map so neighbours never need a bounds check.
+# Straight moves cost 1 and diagonal moves sqrt(2); the heuristic is the octile distance.
+# The search workspace (costs, parents and the generation stamps marking which entries belong
+# to the current query) is allocated once and reused, so a query allocates nothing but heap entries.
+class AStarPathfinder:
+    def __init__(self, mini_map, corner_cutting=PATHFINDING_CORNER_CUTTING):
+        self.corner_cutting = corner_cutting
+        self.load(mini_map)
+
+    # (Re)builds the grid and the workspace from a mini-map.
+    def load(self, mini_map):
+        self.cols = len(mini_map[0])
+        self.rows = len(mini_map)
+        self.width = self.cols + 2
+        size = self.width * (self.rows + 2)
+        self.walls = bytearray(b'\1') * size
+        for y, row in enumerate(mini_map):
+            start = (y + 1) * self.width + 1
+            self.walls[start:start + self.cols] = bytes(1 if value else 0 for value in row)
+        w = self.width
+        # neighbour offsets as (index delta, cost, the two orthogonal index deltas a diagonal passes)
+        self.moves = [(-1, 1, None), (-w, 1, None), (1, 1, None), (w, 1, None),
+                      (-w - 1, SQRT2, (-1, -w)), (-w + 1, SQRT2, (1, -w)),
+                      (w + 1, SQRT2, (1, w)), (w - 1, SQRT2, (-1, w))]
+
+        self.cost = [0.0] * size
+        self.parent = [0] * size
+        self.seen = [0] * size  # generation that last reached a cell
+        self.closed = [0] * size  # generation that last expanded a cell
+        self.blocked = [0] * size  # generation that marked a cell as occupied
+        self.heap = []
+        self.generation = 0
+        self.expanded = 0  # cells expanded by the last query
+
+    def set_tile(self, x, y, value):
+        self.walls[(y + 1) * self.width + x + 1] = 1 if value else 0
+
+    def index(self, pos):
+        return (pos[1] + 1) * self.width + pos[0] + 1
+
+    def tile(self, i):
+        y, x = divmod(i, self.width)
+        return x - 1, y - 1
+
+    # Returns the path from start to goal as a list of tiles (start excluded), or None when the goal
+    # cannot be reached. Tiles in blocked (e.g. NPC positions) are treated as walls, except the goal.
+    def find_path(self, start, goal, blocked=()):
+        self.generation += 1
+        generation = self.generation
+        walls, cost, parent = self.walls, self.cost, self.parent
+        seen, closed, blocked_at = self.seen, self.closed, self.blocked
+        width, corner_cutting = self.width, self.corner_cutting
+        for pos in blocked:
+            blocked_at[self.index(pos)] = generation
+
+        start_i, goal_i = self.index(start), self.index(goal)
+        blocked_at[goal_i] = 0
+        goal_x, goal_y = goal[0] + 1, goal[1] + 1
+        heap = self.heap
+        heap.clear()
+        cost[start_i] = 0.0
+        seen[start_i] = generation
+        heap.append((0.0, 0.0, start_i))
+        expanded = 0
+
+        while heap:
+            _, _, i = heapq.heappop(heap)
+            if closed[i] == generation:
+                continue
+            closed[i] = generation
+            expanded += 1
+            if i == goal_i:  # stops as soon as the goal is expanded
+                break
+            g = cost[i]
+            for delta, step_cost, corners in self.moves:
+                j = i + delta
+                if walls[j] or blocked_at[j] == generation or closed[j] == generation:
+                    continue
+                if corners and not corner_cutting and (walls[i + corners[0]] or walls[i + corners[1]]):
+                    continue
+                new_cost = g + step_cost
+                if seen[j] != generation or new_cost < cost[j]:
+                    seen[j] = generation
+                    cost[j] = new_cost
+                    parent[j] = i
+                    y, x = divmod(j, width)
+                    dx, dy = abs(x - goal_x), abs(y - goal_y)
+                    h = dx + dy + (SQRT2 - 2) * min(dx, dy)
+                    heapq.heappush(heap, (new_cost + h, h, j))
+        self.expanded = expanded
+
+        if closed[goal_i] != generation:
+            return None
+        path = []
+        i = goal_i
+        while i != start_i:
+            path.append(self.tile(i))
+            i = parent[i]
+        path.reverse()
+        return path
+
+    # Returns the next tile from start towards goal, or the goal itself when start == goal or the
+    # goal cannot be reached, like GraphNavigator's BFS.
+    def next_step(self, start, goal, blocked=()):
+        if start == goal:
+            return goal
+        path = self.find_path(start, goal, blocked)
+        return path[0] if path else goal
+
+
+# Hierarchical pathfinding (HPA*) on top of an AStarPathfinder grid. The map is split into square
+# clusters; where two neighbouring clusters share a run of free tiles, entrance tiles are placed
+# (one in the middle of short runs, one at each end of long ones) and linked across the border.
+# Inside every cluster the distances between its entrances are precomputed, which gives a small
+# abstract graph. A query searches the abstract graph for the route and refines only the part
+# inside the start cluster, to get the next tile. When a tile changes only its cluster is marked
+# dirty; it and the clusters sharing its borders are rebuilt before the next query.
+class ClusterPathfinder:
+    def __init__(self, grid, cluster_size=PATHFINDING_CLUSTER_SIZE):
+        self.grid = grid
+        self.size = cluster_size
+        self.build()
+
+    # Splits the grid into clusters and builds every border and cluster of the abstract graph.
+    def build(self):
+        grid, size = self.grid, self.size
+        self.cluster_cols = -(-grid.cols // size)
+        self.cluster_rows = -(-grid.rows // size)
+        self.cluster_of = [-1] * len(grid.walls)
+        for y in range(grid.rows):
+            row = (y + 1) * grid.width + 1
+            for x in range(grid.cols):
+                self.cluster_of[row + x] = (y // size) * self.cluster_cols + x // size
+        self.borders = {}  # (cluster, neighbour cluster) -> [(entrance, entrance across, cost)]
+        self.links = {}  # entrance -> [(entrance across a border, cost)]
+        self.intra = {}  # cluster -> {entrance: [(entrance, distance)]}
+        self.dirty = set()
+        self.field_goal = None
+        self.expanded = 0
+        for c in range(self.cluster_cols * self.cluster_rows):
+            for d in self.neighbours(c):
+                if d > c:
+                    self.build_border(c, d)
+        for c in range(self.cluster_cols * self.cluster_rows):
+            self.build_intra(c)
+
+    # Returns the clusters around a cluster, diagonal ones included.
+    def neighbours(self, c):
+        cy, cx = divmod(c, self.cluster_cols)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                nx, ny = cx + dx, cy + dy
+                if (dx or dy) and 0 <= nx < self.cluster_cols and 0 <= ny < self.cluster_rows:
+                    yield ny * self.cluster_cols + nx
+
+    # Returns the tiles on the edge of a cluster.
+    def edge_tiles(self, c):
+        grid, size = self.grid, self.size
+        cy, cx = divmod(c, self.cluster_cols)
+        left, top = cx * size, cy * size
+        right, bottom = min(grid.cols, left + size) - 1, min(grid.rows, top + size) - 1
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                if x in (left, right) or y in (top, bottom):
+                    yield grid.index((x, y))
+
+    # Finds the entrances between cluster c and a neighbouring cluster d (d > c).
+    # Straight crossings are grouped into runs along the border. Tiles of one run are connected on
+    # both sides, so a diagonal crossing only needs its own entrance when neither of its tiles
+    # belongs to a run.
+    def build_border(self, c, d):
+        for a, b, cost in self.borders.pop((c, d), ()):
+            self.links[a].remove((b, cost))
+            self.links[b].remove((a, cost))
+        grid, cluster_of = self.grid, self.cluster_of
+        walls, corner_cutting = grid.walls, grid.corner_cutting
+        straight, diagonal = [], []
+        for a in self.edge_tiles(c):
+            if walls[a]:
+                continue
+            for delta, step_cost, corners in grid.moves:
+                b = a + delta
+                if cluster_of[b] != d or walls[b]:
+                    continue
+                if corners is None:
+                    straight.append((a, b))
+                elif corner_cutting or not (walls[a + corners[0]] or walls[a + corners[1]]):
+                    diagonal.append((a, b))
+
+        entrances, run = [], []
+        # runs go down the border between clusters side by side, across the one between stacked clusters
+        step = grid.width if c // self.cluster_cols == d // self.cluster_cols else 1
+        for a, b in sorted(straight) + [(None, None)]:
+            if run and a is not None and a - run[-1][0] == step:
+                run.append((a, b))
+                continue
+            if len(run) >= PATHFINDING_ENTRANCE_SPLIT:
+                entrances += [(*run[0], 1), (*run[-1], 1)]
+            elif run:
+                entrances.append((*run[len(run) // 2], 1))
+            run = [(a, b)]
+        in_runs = {tile for pair in straight for tile in pair}
+        entrances += [(a, b, SQRT2) for a, b in diagonal if a not in in_runs and b not in in_runs]
+
+        self.borders[(c, d)] = entrances
+        for a, b, cost in entrances:
+            self.links.setdefault(a, []).append((b, cost))
+            self.links.setdefault(b, []).append((a, cost))
+
+    # Returns the entrances of a cluster.
+    def entrances(self, c):
+        nodes = set()
+        for d in self.neighbours(c):
+            for a, b, _ in self.borders.get((min(c, d), max(c, d)), ()):
+                nodes.add(a if self.cluster_of[a] == c else b)
+        return nodes
+
+    # Precomputes the distances between the entrances of a cluster.
+    def build_intra(self, c):
+        nodes = self.entrances(c)
+        intra = {}
+        for node in nodes:
+            distance, _ = self.search_cluster(node)
+            intra[node] = [(other, distance[other]) for other in nodes if other != node and other in distance]
+        self.intra[c] = intra
+
+    # Dijkstra from a tile, limited to its cluster. Tiles in blocked count as walls.
+    # Returns the distance and the parent of every reached tile.
+    def search_cluster(self, source, blocked=()):
+        grid, cluster_of = self.grid, self.cluster_of
+        walls, moves, corner_cutting = grid.walls, grid.moves, grid.corner_cutting
+        c = cluster_of[source]
+        distance, parent = {source: 0.0}, {source: None}
+        heap = [(0.0, source)]
+        while heap:
+            cost, i = heapq.heappop(heap)
+            if cost > distance[i]:
+                continue
+            self.expanded += 1
+            for delta, step_cost, corners in moves:
+                j = i + delta
+                if walls[j] or cluster_of[j] != c or j in blocked:
+                    continue
+                if corners and not corner_cutting and (walls[i + corners[0]] or walls[i + corners[1]]):
+                    continue
+                new_cost = cost + step_cost
+                if new_cost < distance.get(j, math.inf):
+                    distance[j] = new_cost
+                    parent[j] = i
+                    heapq.heappush(heap, (new_cost, j))
+        return distance, parent
+
+    # Marks the cluster of a changed tile for rebuilding.
+    def invalidate(self, x, y):
+        self.dirty.add(self.cluster_of[self.grid.index((x, y))])
+        self.field_goal = None
+
+    # Rebuilds the borders around the dirty clusters, then the entrance distances of every cluster
+    # whose entrances may have moved. A changed tile can also be the corner a diagonal crossing
+    # between two of its cluster's neighbours passes, so every border inside the 3x3 block of
+    # clusters around a dirty one is rebuilt.
+    def update(self):
+        affected = set()
+        for c in self.dirty:
+            affected.add(c)
+            affected.update(self.neighbours(c))
+        borders = {(c, d) for c in affected for d in self.neighbours(c) if d > c and (d in affected)}
+        for c, d in borders:
+            self.build_border(c, d)
+        for c in affected:
+            self.build_intra(c)
+        self.dirty.clear()
+
+    # Returns the next tile from start towards goal, or the goal itself when start == goal or the
+    # goal cannot be reached. Tiles in blocked are only avoided inside the start cluster.
+    def next_step(self, start, goal, blocked=()):
+        if start == goal:
+            return goal
+        if self.dirty:
+            self.update()
+        grid, cluster_of = self.grid, self.cluster_of
+        start_i, goal_i = grid.index(start), grid.index(goal)
+        if grid.walls[start_i] or grid.walls[goal_i]:
+            return goal
+        self.expanded = 0
+        blocked = {grid.index(pos) for pos in blocked} - {start_i, goal_i}
+        start_distance, start_parent = self.search_cluster(start_i, blocked)
+        start_cluster = cluster_of[start_i]
+        if start_cluster == cluster_of[goal_i] and goal_i in start_distance:
+            return self.refine(start_i, goal_i, start_parent)
+
+        targets = {node: start_distance[node] for node in self.intra[start_cluster] if node in start_distance}
+        if not targets:
+            return goal
+        self.search_field(goal_i, targets)
+        field_cost, closed = self.field_cost, self.field_closed
+        reached = [node for node in targets if node in closed]
+        if not reached:
+            return goal
+        first = min(reached, key=lambda node: start_distance[node] + field_cost[node])
+        if first == start_i:  # start is an entrance itself, take the next node of its route
+            first = self.field_next[start_i]
+            if first == -1 or cluster_of[first] == start_cluster and first not in start_parent:
+                return goal
+            if cluster_of[first] != start_cluster:
+                return grid.tile(first)
+        return self.refine(start_i, first, start_parent)
+
+    # Dijkstra on the abstract graph from the goal outwards. NPCs all chase the player's tile, so the
+    # search is kept and resumed by later queries for the same goal; each query only runs it until
+    # the entrances of its start cluster are settled, or no unsettled one could give a shorter route.
+    # targets maps the start cluster's entrances to their distance from start.
+    def search_field(self, goal_i, targets):
+        if self.field_goal != goal_i:
+            self.field_goal = goal_i
+            self.field_cost, self.field_next, self.field_closed, self.field_heap = {}, {}, set(), []
+            distance, _ = self.search_cluster(goal_i)
+            for node in self.intra[self.cluster_of[goal_i]]:
+                if node in distance:
+                    self.field_cost[node] = distance[node]
+                    self.field_next[node] = -1  # -1: walks to the goal inside the goal cluster
+                    heapq.heappush(self.field_heap, (distance[node], node))
+        cost, next_node, closed, heap = self.field_cost, self.field_next, self.field_closed, self.field_heap
+        intra, cluster_of = self.intra, self.cluster_of
+        best = min([targets[node] + cost[node] for node in targets if node in closed], default=math.inf)
+        min_start_distance = min(targets.values())
+        while heap and heap[0][0] + min_start_distance < best:
+            node_cost, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            closed.add(node)
+            self.expanded += 1
+            if node in targets:
+                best = min(best, targets[node] + node_cost)
+            for other, step_cost in self.links.get(node, []) + intra[cluster_of[node]].get(node, []):
+                new_cost = node_cost + step_cost
+                if other not in closed and new_cost < cost.get(other, math.inf):
+                    cost[other] = new_cost
+                    next_node[other] = node
+                    heapq.heappush(heap, (new_cost, other))
+
+    # Follows the parents of a cluster search back from a target to the tile next to start.
+    def refine(self, start_i, target, parent):
+        while parent[target] != start_i:
+            target = parent[target]
+        return self.grid.tile(target)
+
+
+# Returns a rows x cols mini-map with a wall border and randomly placed wall tiles inside.
+def synthetic_map(cols, rows, density=0.25, seed=0):
+    rng = random.Random(seed)
+    return [[1 if x in (0, cols - 1) or y in (0, rows - 1) or rng.random() < density else False
+             for x in range(cols)] for y in range(rows)]
+
+
+# Compares GraphNavigator's BFS with A* and the cluster graph on a mini-map: average nodes expanded
+# and milliseconds per query from random free tiles to random goals, ten starts per goal like NPCs
+# chasing the player. Every method counts the nodes it takes off its queue, up to and including the
+# goal (the cluster graph counts abstract nodes).
+def benchmark_map(mini_map, queries=200, seed=0):
+    from graphNavigator import GraphNavigator
+    from profiler import Profiler
+    from map import Map
+    from mapFile import MapFile
+    from worldChunks import WorldChunks
+    game = SimpleNamespace(entity_manager=SimpleNamespace(npc_positions=set()), profiler=Profiler())
+    game.map = Map(game, None, MapFile.from_tiles(mini_map, (1.5, 1.5)))
+    game.world = WorldChunks(game, whole_map=True)
+    navigator = GraphNavigator(game)
+    astar = AStarPathfinder(mini_map)
+    start_time = time.perf_counter()
+    hpa = ClusterPathfinder(astar)
+    build_ms = (time.perf_counter() - start_time) * 1000
+    free = sorted(navigator.graph)
+    rng = random.Random(seed)
+    goals = [rng.choice(free) for _ in range(queries // 10)]
+    pairs = [(rng.choice(free), goal) for goal in goals for _ in range(10)]
+    queries = len(pairs)
+
+    results = {}
+    for name in ('bfs', 'astar', 'hpa'):
+        expanded = 0
+        start_time = time.perf_counter()
+        for start, goal in pairs:
+            if name == 'bfs':
+                visited = navigator.bfs(start, goal, navigator.graph)
+                # the queue runs in the insertion order of visited, so the goal's place in it counts the
+                # nodes dequeued; the nodes enqueued after it were never expanded
+                expanded += list(visited).index(goal) + 1 if goal in visited else len(visited)
+            elif name == 'astar':
+                astar.find_path(start, goal)
+                expanded += astar.expanded
+            else:
+                hpa.next_step(start, goal)
+                expanded += hpa.expanded
+        elapsed = time.perf_counter() - start_time
+        results[name] = expanded / queries, elapsed / queries * 1000
+    return results, build_ms
+
+
+if __name__ == '__main__':
+    from mapFile import MapFile, get_map_path
+    built_in = [MapFile.open(get_map_path(map_num)) for map_num in (1, 2)]
+    built_in = [[list(data.tiles[y * data.cols:(y + 1) * data.cols]) for y in range(data.rows)] for data in built_in]
+    maps = [('map 1', built_in[0]), ('map 2', built_in[1]), ('synthetic 64x64', synthetic_map(64, 64)),
+            ('synthetic 256x256', synthetic_map(256, 256)), ('synthetic 512x512', synthetic_map(512, 512))]
+    for name, mini_map in maps:
+        results, build_ms = benchmark_map(mini_map, queries=50 if len(mini_map) > 256 else 200)
+        print(f'{name}: ' + ', '.join(f'{method} {expanded:.0f} nodes {ms:.3f} ms'
+                                      for method, (expanded, ms) in results.items())
+              + f' (cluster graph built in {build_ms:.0f} ms)')
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+
+# A bounded least-recently-used store with hit/miss/eviction counters. Subclasses decide when the
+# cache is over its bound (over_limit) and keep their own accounting of what is evicted (evict).
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the cached value for a key, or None after counting a miss.
+    def lookup(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    # Stores a value as the most recently used one, evicting the least recently used ones once the
+    # cache is full.
+    def store(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while self.over_limit():
+            self.evict()
+        return value
+
+    def over_limit(self):
+        return len(self.entries) > self.max_size
+
+    # Drops the least recently used entry and returns its value.
+    def evict(self):
+        _, value = self.entries.popitem(last=False)
+        self.evictions += 1
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    # Returns the counters used to size the cache.
+    def stats(self):
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
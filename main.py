@@ -10,24 +10,41 @@ from entityManager import *
 from weapon import *
 from sound import *
 from graphNavigator import *
+from profiler import Profiler
+from assetRegistry import AssetRegistry
+from assetPack import AssetPack
+from visibility import VisibilityTable
+from worldChunks import WorldChunks
 WHITE = pg.Color('white')
 BLACK = pg.Color('black')
 GREY = pg.Color('grey')
 
 # Represents the main game class responsible for managing the game loop and game elements.
+# When a map and difficulty are given the selection menus are skipped.
 class Game:
-    def __init__(self):
+    def __init__(self, map_choice=None, difficulty_choice=None):
         pg.init()
         pg.mouse.set_visible(False)
         self.screen = pg.display.set_mode(RES)
+        self.assets = AssetRegistry(AssetPack.open())
+        self.cross_sight = self.assets.acquire('resources/cross.png', 'ui')
+        self.preload_level_assets()
         pg.event.set_grab(True)
         self.clock = pg.time.Clock()
-        self.delta_time = 1
-        self.global_trigger = False
-        self.global_event = pg.USEREVENT + 0
-        pg.time.set_timer(self.global_event, 40)
+        self.profiler = Profiler()
+        self.delta_time = SIM_TICK_TIME  # milliseconds simulated by a tick
+        self.frame_time = 0  # real milliseconds the last frame took
+        self.accumulator = 0  # real milliseconds not simulated yet
+        self.ticks = 0  # ticks run in the last frame
+        self.sim_time = 0  # milliseconds simulated so far
+        self.global_trigger = False  # set for the ticks on which the global trigger fires
+        self.next_trigger = GLOBAL_TRIGGER_TIME
         self.sound = Sound(self)
         pg.mixer.music.play(-2)
+        self.scripted_input = None  # set by benchmark.py to replace keyboard and mouse input
+        if map_choice is not None and difficulty_choice is not None:
+            self.new_game(map_choice, difficulty_choice)
+            return
         self.map_choice = None
         self.mapSelection()
         self.difficulty_choice = None;
@@ -39,7 +56,7 @@ class Game:
         # Define font and size
         font = pg.font.SysFont('comicsansms', 50)
         text = font.render('Choose a map', True, WHITE)
-        background_image = pg.image.load("resources\opening.png")
+        background_image = self.assets.acquire('resources/opening.png', 'ui')
         self.screen.blit(background_image, (0, 0))
         # Define button size and position
         button_width = 200
@@ -82,12 +99,14 @@ class Game:
             self.screen.blit(button2_text, (button_x + (button_width - button2_text.get_width()) // 2,
                                             button_y2 + (button_height - button2_text.get_height()) // 2))
             pg.display.update()
+        # the menu background is only needed while a menu is shown
+        self.assets.release(background_image)
 
 
     # Displays a difficulty selection screen and allows the user to choose a difficulty level.
     def difficultySelection(self):
         # define image
-        background_image = pg.image.load("resources\opening.png")
+        background_image = self.assets.acquire('resources/opening.png', 'ui')
         self.screen.blit(background_image, (0, 0))
         # Define font and size
         font = pg.font.SysFont('comicsansms', 50)
@@ -134,62 +153,116 @@ class Game:
             self.screen.blit(button2_text, (button_x + (button_width - button2_text.get_width()) // 2,
                                             button_y2 + (button_height - button2_text.get_height()) // 2))
             pg.display.update()
+        # the menu background is only needed while a menu is shown
+        self.assets.release(background_image)
 
         # Once a difficulty is chosen, start the game
         self.new_game(self.map_choice, self.difficulty_choice)
 
+    # Starts decoding the level images on the asset workers while the menus are shown,
+    # so building the level after the choices only has to convert them.
+    def preload_level_assets(self):
+        RenderingEngine.preload(self.assets)
+        EntityManager.preload(self.assets)
+        self.assets.preload_frames(Weapon.sprite_path.rsplit('/', 1)[0])
+
     # Starts a new game with the selected map and difficulty level.
     def new_game(self, map_choice,difficulty_choice):
         # self.sound = Sound(self)
         # pg.mixer.music.play(-1)
         self.map_choice = map_choice
+        previous_level = [getattr(self, name, None) for name in ('object_renderer', 'entity_manager', 'weapon')]
         self.map = Map(self,map_choice)
+        self.visibility = VisibilityTable(self)
         self.player = Player(self)
+        self.world = WorldChunks(self)
         self.object_renderer = RenderingEngine(self)
         self.raycasting = RayCasting(self)
         self.difficulty_choice = difficulty_choice
         self.entity_manager = EntityManager(self, difficulty_choice)
         self.weapon = Weapon(self)
         self.pathfinding = GraphNavigator(self)
+        # released after the new level is built, so images both levels use stay loaded
+        for part in previous_level:
+            if part is not None:
+                part.release()
 
 
     # Updates the game elements and handles the game logic.
+    # The simulation advances in fixed ticks of SIM_TICK_TIME milliseconds, as many as fit in the real time
+    # that passed, so gameplay does not depend on the frame rate. A slow frame runs at most SIM_MAX_TICKS
+    # ticks and drops the rest of the backlog instead of falling further behind.
     def update(self):
-        cross_sight = pg.image.load("resources\cross.png")
-        self.screen.blit(cross_sight, (775, 450))
-        self.player.update()
-        self.raycasting.update()
-        self.entity_manager.update()
-        self.weapon.update()
-        pg.display.flip()
-        self.delta_time = self.clock.tick(FPS)
+        self.screen.blit(self.cross_sight, (775, 450))
+        self.accumulator += self.frame_time
+        self.ticks = 0
+        self.entity_manager.scheduler.begin_frame()
+        while self.accumulator >= SIM_TICK_TIME:
+            if self.ticks == SIM_MAX_TICKS:
+                self.accumulator %= SIM_TICK_TIME
+                break
+            with self.profiler.span('Game.tick'):
+                self.tick()
+            self.accumulator -= SIM_TICK_TIME
+            self.ticks += 1
+        with self.profiler.span('display.flip'):
+            pg.display.flip()
+        self.frame_time = self.clock.tick(FPS)
         pg.display.set_caption(f'{self.clock.get_fps() :.1f}')
 
+    # Advances the player, the NPCs and the weapon by one tick.
+    # The global trigger follows simulated time, so it fires as often per tick whatever the frame rate.
+    def tick(self):
+        self.sim_time += SIM_TICK_TIME
+        self.global_trigger = self.sim_time >= self.next_trigger
+        if self.global_trigger:
+            self.next_trigger += GLOBAL_TRIGGER_TIME
+        profiler = self.profiler
+        with profiler.span('player.update'):
+            self.player.update()
+        with profiler.span('entity_manager.update'):
+            self.entity_manager.update()
+        with profiler.span('weapon.update'):
+            self.weapon.update()
+
     # Draws the game elements on the screen.
+    # The view is rendered from the player's pose interpolated between the last two ticks, by the
+    # share of a tick the accumulator holds.
     def draw(self):
         # self.screen.fill('black')
-        self.object_renderer.draw()
-        self.weapon.draw()
+        with self.player.interpolated(self.accumulator / SIM_TICK_TIME):
+            with self.profiler.span('raycasting.update'):
+                self.raycasting.update()
+            with self.profiler.span('entity_manager.project'):
+                self.entity_manager.project()
+            with self.profiler.span('object_renderer.draw'):
+                self.object_renderer.draw()
+        with self.profiler.span('weapon.draw'):
+            self.weapon.draw()
+        self.profiler.draw_overlay(self.screen)
         # self.map.draw()
         # self.player.draw()
 
     # Checks for various events, such as quitting the game or key presses.
     def checkEvents(self):
-        self.global_trigger = False
         for event in pg.event.get():
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
                 pg.quit()
                 sys.exit()
-            elif event.type == self.global_event:
-                self.global_trigger = True
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.profiler.toggle_overlay()
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                self.profiler.export_chrome_trace()
             self.player.single_fire_event(event)
 
     # Runs the game loop.
     def run(self):
         while True:
+            self.profiler.begin_frame()
             self.checkEvents()
             self.update()
             self.draw()
+            self.profiler.end_frame()
 
 
 if __name__ == '__main__':
@@ -1,95 +1,85 @@
 import pygame as pg
+from collections import deque
+from settings import *
+from mapFile import MapFile, WallMap, get_map_path, NO_SPAWN, SPAWN
+from mapGenerator import generate_map, parse_map_spec, is_generated_map
 
-_ = False
-mini_map1 = [
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, 3, 3, 3, 5, _, _, _, 3, 3, 3, _, _, 1],
-    [1, _, _, _, _, _, 4, _, _, _, _, _, 3, _, _, 1],
-    [1, _, _, _, _, _, 4, _, _, _, _, _, 3, _, _, 1],
-    [1, _, _, 3, 3, 3, 3, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, 4, _, _, _, 4, _, _, _, _, _, _, 1],
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
-    [1, 1, 3, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
-    [1, 4, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [3, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, 2, _, _, _, _, _, 3, 4, _, 4, 3, _, 1],
-    [1, _, _, 5, _, _, _, _, _, _, 3, _, 3, _, _, 1],
-    [1, _, _, 2, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, 4, _, _, _, _, _, _, 4, _, _, 4, _, _, _, 1],
-    [1, 1, 3, 3, _, _, 3, 3, 1, 3, 3, 1, 3, 1, 1, 1],
-    [1, 1, 1, 3, _, _, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-    [1, 3, 3, 4, _, _, 4, 3, 3, 3, 3, 3, 3, 3, 3, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, 5, _, _, _, 5, _, _, _, 5, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-]
-
-mini_map2 = [
-    [2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, 4, 4, 4, _, _, _, _, _, _, _, 5, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, 2, 2, 2, 2, 2, 2, 2, 2, _, _, 2, 2, 2, 2, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, 4, _, _, _, _, _, _, _, _, _, _, 2, _, 2],
-    [2, _, 4, _, _, _, _, 5, 5, 5, _, _, _, 2, _, 2],
-    [2, _, 4, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, 2, 5, _, _, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, 4, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, 5, _, _, _, _, _, 2],
-    [2, _, _, 4, _, _, _, _, _, 4, 4, _, 4, _, _, 2],
-    [2, _, _, 5, _, _, _, _, _, 4, 4, _, 4, _, _, 2],
-    [2, _, _, 4, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, 2, _, _, _, _, _, _, 4, _, _, 4, _, _, _, 2],
-    [2, 2, 2, 2, _, _, 2, 2, 2, 2, 2, 2, 3, 2, 2, 2],
-    [2, 2, 2, 3, _, _, 3, 1, 1, 1, 1, 1, 1, 1, 1, 2],
-    [2, 3, 3, 4, _, _, 4, 3, 3, 3, 3, 3, 3, 3, 3, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, 5, _, _, _, 5, _, _, _, 5, _, _, _, 2],
-    [2, _, _, 5, _, _, _, 5, _, _, _, 5, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
-    [2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
-]
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Represents the game map that the player navigates through.
-# Initializes the map with the specified game instance and map choice.
+# Initializes the map with the specified game instance and map choice (a built-in map number, or a
+# procedural map like 'maze:512x512:3', see mapGenerator.py), or with already loaded map data.
+# The tiles of the map file are the only copy of the map: tiles is a flat view of them for scalar
+# lookups (see get_tile) and grid the same bytes as a rows x cols NumPy array for array code.
+# mini_map (rows) and world_map (walls by (x, y)) are views of them for older code.
 class Map:
-    def __init__(self, game, map_num):
+    def __init__(self, game, map_num, data=None):
         self.game = game
-        if map_num == 1:
-            self.mini_map = mini_map1
-        elif map_num == 2:
-            self.mini_map = mini_map2
-        self.world_map = {}
-        self.rows = len(self.mini_map)
-        self.cols = len(self.mini_map[0])
-        self.get_map()
+        if data is None:
+            data = generate_map(**parse_map_spec(map_num)) if is_generated_map(map_num) \
+                else MapFile.open(get_map_path(map_num))
+        self.data = data
+        self.rows = self.data.rows
+        self.cols = self.data.cols
+        self.tiles = self.data.tiles
+        self.grid = np.ndarray((self.rows, self.cols), np.uint8, self.tiles) if np is not None else None
+        self.mini_map = [self.tiles[y * self.cols:(y + 1) * self.cols] for y in range(self.rows)]
+        self.world_map = WallMap(self)
+        self.player_pos = self.data.player_pos
+        self.spawn_zones = self.data.spawn_zones
+        self.sprites = self.data.sprites
+        self.lights = self.data.lights
+        self.version = 0  # bumped on every tile change, so users of the map know to refresh
+        self.changes = deque(maxlen=MAP_CHANGE_HISTORY)  # (version, x, y) of the latest tile changes
+
+    # Returns the texture of the wall at (x, y), or 0 for an empty tile; tiles off the map are empty.
+    # Hot loops inline this as 0 <= x < cols and 0 <= y < rows and tiles[y * cols + x].
+    def get_tile(self, x, y):
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self.tiles[y * self.cols + x]
+        return 0
+
+    def is_wall(self, x, y):
+        return 0 <= x < self.cols and 0 <= y < self.rows and self.tiles[y * self.cols + x] != 0
+
+    # Changes one tile; a falsy value clears it, any other value makes it a wall with that texture.
+    def set_tile(self, x, y, value):
+        self.tiles[y * self.cols + x] = int(value or 0)
+        self.version += 1
+        self.changes.append((self.version, x, y))
+
+    # Returns the tiles changed after a version, or None when they are no longer all remembered.
+    def changes_since(self, version):
+        if self.changes and self.changes[0][0] > version + 1:
+            return None
+        return [(x, y) for changed, x, y in self.changes if changed > version]
+
+    # Returns True when NPCs may spawn on a tile: a free tile outside every no spawn zone and, when
+    # the map has spawn zones, inside one of them.
+    def is_spawn_tile(self, pos):
+        x, y = pos
+        if self.is_wall(x, y):
+            return False
+        inside = [kind for left, top, right, bottom, kind in self.spawn_zones if left <= x < right and top <= y < bottom]
+        if NO_SPAWN in inside:
+            return False
+        return SPAWN in inside or not any(zone[4] == SPAWN for zone in self.spawn_zones)
 
-    def get_map(self):
-        for j, row in enumerate(self.mini_map):
-            for i, value in enumerate(row):
-                if value:
-                    self.world_map[(i, j)] = value
+    # Returns is_spawn_tile for every tile at once, as a rows x cols bool array.
+    def get_spawn_mask(self):
+        allowed = np.zeros((self.rows, self.cols), bool)
+        if not any(zone[4] == SPAWN for zone in self.spawn_zones):
+            allowed[:] = True
+        for left, top, right, bottom, kind in self.spawn_zones:
+            if kind == SPAWN:
+                allowed[top:bottom, left:right] = True
+        for left, top, right, bottom, kind in self.spawn_zones:
+            if kind == NO_SPAWN:
+                allowed[top:bottom, left:right] = False
+        return allowed & (self.grid == 0)
 
     # Draws the map on the screen.
     def draw(self):
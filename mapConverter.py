@@ -0,0 +1,104 @@
+from settings import *
+from mapFile import write_map_file, get_map_path, NO_SPAWN
+
+# Converts the built-in maps, which were hardcoded as the mini-map lists below together with the
+# sprite placement of EntityManager and its spawn restriction, into map files under MAP_DIR.
+# Run this module directly to write them again.
+
+_ = False
+mini_map1 = [
+    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, 3, 3, 3, 5, _, _, _, 3, 3, 3, _, _, 1],
+    [1, _, _, _, _, _, 4, _, _, _, _, _, 3, _, _, 1],
+    [1, _, _, _, _, _, 4, _, _, _, _, _, 3, _, _, 1],
+    [1, _, _, 3, 3, 3, 3, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, 4, _, _, _, 4, _, _, _, _, _, _, 1],
+    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
+    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
+    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
+    [1, 1, 3, 1, 1, 1, 1, 1, 1, 1, _, _, 1, 1, 1, 1],
+    [1, 4, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [3, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, 2, _, _, _, _, _, 3, 4, _, 4, 3, _, 1],
+    [1, _, _, 5, _, _, _, _, _, _, 3, _, 3, _, _, 1],
+    [1, _, _, 2, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, 4, _, _, _, _, _, _, 4, _, _, 4, _, _, _, 1],
+    [1, 1, 3, 3, _, _, 3, 3, 1, 3, 3, 1, 3, 1, 1, 1],
+    [1, 1, 1, 3, _, _, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+    [1, 3, 3, 4, _, _, 4, 3, 3, 3, 3, 3, 3, 3, 3, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, 5, _, _, _, 5, _, _, _, 5, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 1],
+    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+]
+
+mini_map2 = [
+    [2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, 4, 4, 4, _, _, _, _, _, _, _, 5, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, 2, 2, 2, 2, 2, 2, 2, 2, _, _, 2, 2, 2, 2, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, 4, _, _, _, _, _, _, _, _, _, _, 2, _, 2],
+    [2, _, 4, _, _, _, _, 5, 5, 5, _, _, _, 2, _, 2],
+    [2, _, 4, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, 2, 5, _, _, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, 4, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, 5, _, _, _, _, _, 2],
+    [2, _, _, 4, _, _, _, _, _, 4, 4, _, 4, _, _, 2],
+    [2, _, _, 5, _, _, _, _, _, 4, 4, _, 4, _, _, 2],
+    [2, _, _, 4, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, 2, _, _, _, _, _, _, 4, _, _, 4, _, _, _, 2],
+    [2, 2, 2, 2, _, _, 2, 2, 2, 2, 2, 2, 3, 2, 2, 2],
+    [2, 2, 2, 3, _, _, 3, 1, 1, 1, 1, 1, 1, 1, 1, 2],
+    [2, 3, 3, 4, _, _, 4, 3, 3, 3, 3, 3, 3, 3, 3, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, 5, _, _, _, 5, _, _, _, 5, _, _, _, 2],
+    [2, _, _, 5, _, _, _, 5, _, _, _, 5, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, _, _, _, _, _, _, _, _, _, _, _, _, _, _, 2],
+    [2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
+]
+
+# animated lights (the frames directory under resources/sprites/animated_sprites/) and their positions
+lights = [
+    ('green_light', 11.5, 3.5), ('green_light', 1.5, 1.5), ('green_light', 1.5, 7.5),
+    ('green_light', 5.5, 3.25), ('green_light', 5.5, 4.75), ('green_light', 7.5, 2.5),
+    ('green_light', 7.5, 5.5), ('green_light', 14.5, 1.5), ('green_light', 14.5, 4.5),
+    ('red_light', 14.5, 5.5), ('red_light', 14.5, 7.5), ('red_light', 12.5, 7.5),
+    ('red_light', 9.5, 7.5), ('red_light', 14.5, 12.5), ('red_light', 9.5, 20.5),
+    ('red_light', 10.5, 20.5), ('red_light', 3.5, 14.5), ('red_light', 3.5, 18.5),
+    ('green_light', 14.5, 24.5), ('green_light', 14.5, 30.5), ('green_light', 1.5, 30.5),
+    ('green_light', 1.5, 24.5),
+]
+# no NPCs spawn in the 10 x 10 tiles around the player's start
+spawn_zones = [(0, 0, 10, 10, NO_SPAWN)]
+
+maps = {1: mini_map1, 2: mini_map2}
+
+
+def convert():
+    for map_num, mini_map in maps.items():
+        path = get_map_path(map_num)
+        write_map_file(path, mini_map, PLAYER_POS, spawn_zones, lights=lights)
+        print(f'wrote {path}')
+
+
+if __name__ == '__main__':
+    convert()
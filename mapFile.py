@@ -0,0 +1,110 @@
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from settings import *
+
+MAP_MAGIC = b'GMAP'
+MAP_VERSION = 1
+# magic, version, cols, rows, spawn zones, sprites, lights, name table bytes, player x, player y
+MAP_HEADER = struct.Struct('<4sIIIIIIIff')
+SPAWN_ZONE = struct.Struct('<HHHHB3x')  # left, top, right, bottom (exclusive), kind
+PLACEMENT = struct.Struct('<I2f')  # name index, x, y
+# spawn zone kinds: NPCs never spawn in a no spawn zone; when a map has spawn zones they only spawn in them
+NO_SPAWN, SPAWN = 0, 1
+
+
+# A map in the map file format: a header, then the tile grid as rows x cols bytes (0 is an empty
+# tile, any other value the texture of a wall), then the spawn zone, sprite and light tables, and
+# last the sprite names the tables refer to. The grid is used in place in the given writable buffer,
+# without being parsed.
+class MapFile:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        (magic, version, self.cols, self.rows, spawn_count, sprite_count, light_count, names_size,
+         player_x, player_y) = MAP_HEADER.unpack_from(self.buffer)
+        if magic != MAP_MAGIC or version != MAP_VERSION:
+            raise ValueError(f'not a version {MAP_VERSION} map file')
+        self.player_pos = player_x, player_y
+        offset = MAP_HEADER.size
+        self.tiles = memoryview(self.buffer)[offset:offset + self.cols * self.rows]
+        offset += -(-self.cols * self.rows // 4) * 4
+        self.spawn_zones, offset = read_table(self.buffer, offset, SPAWN_ZONE, spawn_count)
+        sprites, offset = read_table(self.buffer, offset, PLACEMENT, sprite_count)
+        lights, offset = read_table(self.buffer, offset, PLACEMENT, light_count)
+        names = self.buffer[offset:offset + names_size].decode().split('\0')
+        self.sprites = [(names[name], x, y) for name, x, y in sprites]
+        self.lights = [(names[name], x, y) for name, x, y in lights]
+
+    # Memory maps a map file copy on write, so changing a tile never touches the file.
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+
+    # Packs a map given as a grid (see pack_map) into a new buffer.
+    @classmethod
+    def from_tiles(cls, tiles, player_pos, spawn_zones=(), sprites=(), lights=()):
+        return cls(bytearray(pack_map(tiles, player_pos, spawn_zones, sprites, lights)))
+
+
+def read_table(buffer, offset, record, count):
+    end = offset + record.size * count
+    return list(record.iter_unpack(buffer[offset:end])), end
+
+
+# Returns a map in the map file format. tiles is a rows x cols grid of texture ids (a list of rows,
+# or a 2-D uint8 array), spawn_zones a list of (left, top, right, bottom, kind), and sprites and
+# lights lists of (name, x, y).
+def pack_map(tiles, player_pos, spawn_zones=(), sprites=(), lights=()):
+    rows, cols = len(tiles), len(tiles[0])
+    names = sorted({name for name, _, _ in list(sprites) + list(lights)})
+    index = {name: i for i, name in enumerate(names)}
+    name_table = '\0'.join(names).encode()
+    if hasattr(tiles, 'tobytes'):
+        grid = tiles.tobytes()
+    else:
+        grid = bytes(int(value or 0) for row in tiles for value in row)
+    parts = [MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, cols, rows, len(spawn_zones), len(sprites),
+                             len(lights), len(name_table), *player_pos),
+             grid, bytes(-len(grid) % 4)]
+    parts += [SPAWN_ZONE.pack(*zone) for zone in spawn_zones]
+    parts += [PLACEMENT.pack(index[name], x, y) for name, x, y in list(sprites) + list(lights)]
+    parts.append(name_table)
+    return b''.join(parts)
+
+
+def write_map_file(path, tiles, player_pos, spawn_zones=(), sprites=(), lights=()):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(pack_map(tiles, player_pos, spawn_zones, sprites, lights))
+
+
+def get_map_path(map_num):
+    return os.path.join(MAP_DIR, f'map{map_num}.gmap')
+
+
+# Read-only mapping of wall tiles (x, y) to their texture, read straight from a map's tile grid.
+# Kept for compatibility with code written against the old world_map dict; new code uses
+# Map.get_tile and Map.is_wall, or the grid itself.
+class WallMap(Mapping):
+    def __init__(self, game_map):
+        self.map = game_map
+
+    def __getitem__(self, pos):
+        value = self.map.get_tile(*pos)
+        if not value:
+            raise KeyError(pos)
+        return value
+
+    def __contains__(self, pos):
+        return self.map.is_wall(*pos)
+
+    def __iter__(self):
+        cols = self.map.cols
+        for i, value in enumerate(self.map.tiles):
+            if value:
+                yield i % cols, i // cols
+
+    def __len__(self):
+        return len(self.map.tiles) - bytes(self.map.tiles).count(0)
@@ -0,0 +1,145 @@
+import time
+from settings import *
+from mapFile import MapFile, NO_SPAWN
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAP_KINDS = 'rooms', 'arena', 'maze'
+MIN_MAP_SIZE, MAX_MAP_SIZE = 32, 2048
+
+
+# Procedural maps for scaling tests, built from a seed with whole-array NumPy operations. A map is
+# chosen with a map number of the form 'kind:COLSxROWS[:seed]', e.g. 'maze:512x512:3', wherever the
+# built-in map numbers are accepted (Map, benchmark.py --map). Every kind keeps a wall border and
+# is built so that its free tiles are connected, and the player's start is carved into them.
+def generate_map(kind, cols, rows, seed=0, wall_density=None, textures=None, lights=MAP_GENERATOR_LIGHTS):
+    if np is None:
+        raise RuntimeError('procedural maps need numpy')
+    if kind not in MAP_KINDS:
+        raise ValueError(f'unknown map kind {kind!r}, expected one of {", ".join(MAP_KINDS)}')
+    if not (MIN_MAP_SIZE <= cols <= MAX_MAP_SIZE and MIN_MAP_SIZE <= rows <= MAX_MAP_SIZE):
+        raise ValueError(f'map size must be between {MIN_MAP_SIZE} and {MAX_MAP_SIZE} tiles')
+    rng = np.random.default_rng(seed)
+    density = MAP_GENERATOR_DENSITY[kind] if wall_density is None else wall_density
+    walls = np.ones((rows, cols), bool)
+    inner, anchor = GENERATORS[kind](rng, cols - 2, rows - 2, density)
+    walls[1:-1, 1:-1] = inner
+    player_x, player_y = min(int(PLAYER_POS[0]), cols - 2), min(int(PLAYER_POS[1]), rows - 2)
+    carve_path(walls, (player_x, player_y), (anchor[0] + 1, anchor[1] + 1))
+
+    tiles = np.zeros((rows, cols), np.uint8)
+    ids, weights = zip(*(textures or MAP_GENERATOR_TEXTURES).items())
+    tiles[walls] = rng.choice(np.array(ids, np.uint8), walls.sum(), p=np.array(weights) / sum(weights))
+
+    free = np.flatnonzero(~walls)
+    placed = rng.choice(free, min(len(free), int(len(free) * lights)), replace=False)
+    names = rng.choice(['green_light', 'red_light'], len(placed))
+    light_list = [(str(name), i % cols + 0.5, i // cols + 0.5) for name, i in zip(names, placed.tolist())]
+    # no NPCs spawn in the 10 x 10 tiles around the player's start, like on the built-in maps
+    spawn_zones = [(max(player_x - 5, 0), max(player_y - 5, 0), player_x + 5, player_y + 5, NO_SPAWN)]
+    return MapFile.from_tiles(tiles, (player_x + 0.5, player_y + 0.5), spawn_zones, lights=light_list)
+
+
+# Returns the arguments of generate_map for a map number like 'rooms:256x256:7'.
+def parse_map_spec(spec):
+    kind, size, *seed = spec.split(':')
+    cols, _, rows = size.partition('x')
+    return {'kind': kind, 'cols': int(cols), 'rows': int(rows or cols), 'seed': int(seed[0]) if seed else 0}
+
+
+def is_generated_map(map_num):
+    return isinstance(map_num, str) and not map_num.isdigit()
+
+
+# Rooms and corridors: the area is split into square cells of MAP_GENERATOR_ROOM_SIZE tiles, each
+# with a room around its centre, whose size shrinks as the density grows. Rooms are linked to
+# the next cell east or south by corridors through the cell centres, one of the two at random
+# (a spanning tree, so every room is reachable), plus extra links where the density is low.
+def rooms_walls(rng, cols, rows, density):
+    size = MAP_GENERATOR_ROOM_SIZE
+    cells_x, cells_y = max(cols // size, 1), max(rows // size, 1)
+    centre = size // 2
+    largest = centre - 1
+    half = (rng.uniform(0.5, 1.5, (2, cells_y, cells_x)) * (1 - density) * largest).round()
+    half_w, half_h = half.clip(1, largest).astype(np.intp)
+    east, south = tree_links(rng, cells_x, cells_y, 0.5 * (1 - density))
+    west = np.zeros_like(east)
+    west[:, 1:] = east[:, :-1]
+    north = np.zeros_like(south)
+    north[1:] = south[:-1]
+
+    cell_x, offset_x = np.divmod(np.arange(cells_x * size), size)
+    cell_y, offset_y = np.divmod(np.arange(cells_y * size), size)
+    cy, cx = cell_y[:, None], cell_x[None, :]
+    dx, dy = offset_x[None, :] - centre, offset_y[:, None] - centre
+    free = (np.abs(dx) <= half_w[cy, cx]) & (np.abs(dy) <= half_h[cy, cx])
+    free |= (dy == 0) & (((dx >= 0) & east[cy, cx]) | ((dx <= 0) & west[cy, cx]))
+    free |= (dx == 0) & (((dy >= 0) & south[cy, cx]) | ((dy <= 0) & north[cy, cx]))
+
+    walls = np.ones((rows, cols), bool)
+    used_rows, used_cols = min(rows, cells_y * size), min(cols, cells_x * size)
+    walls[:used_rows, :used_cols] = ~free[:used_rows, :used_cols]
+    return walls, (min(centre, used_cols - 1), min(centre, used_rows - 1))
+
+
+# Open arena: square pillars of 2 x 2 tiles on a grid with a pitch of 3, each present with the
+# given density. The lanes between pillar sites are always free, so the floor stays connected.
+def arena_walls(rng, cols, rows, density):
+    pitch = 3
+    pillars = rng.random((-(-rows // pitch), -(-cols // pitch))) < density
+    block_x, offset_x = np.divmod(np.arange(cols), pitch)
+    block_y, offset_y = np.divmod(np.arange(rows), pitch)
+    on_site = (offset_y[:, None] < pitch - 1) & (offset_x[None, :] < pitch - 1)
+    walls = on_site & pillars[block_y[:, None], block_x[None, :]]
+    return walls, (pitch - 1, pitch - 1)
+
+
+# Maze with corridors one tile wide: cells on every other tile, each opened to its east or south
+# neighbour at random (a binary tree maze, so it is a spanning tree). A density below 1 also opens
+# each remaining wall between two cells with probability 1 - density, adding loops.
+def maze_walls(rng, cols, rows, density):
+    cells_x, cells_y = (cols + 1) // 2, (rows + 1) // 2
+    east, south = tree_links(rng, cells_x, cells_y, 1 - density)
+    walls = np.ones((rows, cols), bool)
+    walls[0::2, 0::2] = False
+    walls[0::2, 1::2] = ~east[:, :cols // 2]
+    walls[1::2, 0::2] = ~south[:rows // 2]
+    return walls, (0, 0)
+
+
+# Returns which cells of a cells_y x cells_x grid link to their east and south neighbours: a
+# binary tree spanning every cell (each cell links east or south, along the last row and column
+# the only way left), plus every other link with probability extra.
+def tree_links(rng, cells_x, cells_y, extra):
+    go_east = rng.random((cells_y, cells_x)) < 0.5
+    go_east[-1, :] = True
+    go_east[:, -1] = False
+    east = go_east | (rng.random((cells_y, cells_x)) < extra)
+    south = ~go_east | (rng.random((cells_y, cells_x)) < extra)
+    east[:, -1] = False
+    south[-1, :] = False
+    return east, south
+
+
+# Clears an L-shaped path of tiles from start to end, first along the row of start.
+def carve_path(walls, start, end):
+    (x0, y0), (x1, y1) = start, end
+    walls[y0, min(x0, x1):max(x0, x1) + 1] = False
+    walls[min(y0, y1):max(y0, y1) + 1, x1] = False
+
+
+GENERATORS = {'rooms': rooms_walls, 'arena': arena_walls, 'maze': maze_walls}
+
+
+# Times generating every kind of map at a few sizes. Run this module directly.
+if __name__ == '__main__':
+    for size in (32, 256, 1024, 2048):
+        for kind in MAP_KINDS:
+            start_time = time.perf_counter()
+            data = generate_map(kind, size, size, seed=1)
+            elapsed = (time.perf_counter() - start_time) * 1000
+            walls = 1 - bytes(data.tiles).count(0) / (size * size)
+            print(f'{kind} {size}x{size}: {elapsed:.0f} ms, {walls:.0%} walls, {len(data.lights)} lights')
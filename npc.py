@@ -3,7 +3,10 @@ from random import randint, random
 
 # subclass of AnimatedSprite and represents a generic non-player character (NPC) in the game.
 class NPC(spriteAnimator):
-    def __init__(self, game, path='resources/sprites/npc/rangeNPC/0.png', pos=(10.5, 5.5),
+    asset_category = 'npc'
+    sprite_path = 'resources/sprites/npc/rangeNPC/0.png'
+
+    def __init__(self, game, path=sprite_path, pos=(10.5, 5.5),
                  scale=0.6, shift=0.38, animation_time=180):
         super().__init__(game, path, pos, scale, shift, animation_time)
         self.attack_pics = self.get_images(self.path + '/attack')
@@ -24,35 +27,61 @@ class NPC(spriteAnimator):
         self.raycastValue = False
         self.numFrames = 0
         self.playerSearch = False
-
-    # Updates the state of the NPC by checking the animation time, getting the current sprite, and running the logic.
+        self.next_pos = None  # next tile towards the player, from the last path lookup
+        self.next_think = 0  # game time of the next think, set by the AI scheduler
+
+    # Returns the directories holding this NPC type's frames, as loaded in __init__.
+    @classmethod
+    def frame_dirs(cls):
+        path = cls.sprite_path.rsplit('/', 1)[0]
+        return [path] + [path + '/' + name for name in ('attack', 'death', 'idle', 'pain', 'walk')]
+
+    # Runs the expensive part of the logic, as often as the AI scheduler allows: checks the line of sight
+    # to the player and looks up the next tile towards the player once the NPC is searching for them.
+    def think(self):
+        self.theta = math.atan2(self.y - self.player.y, self.x - self.player.x)  # thinks run before locate
+        self.raycastValue = self.can_see_player()
+        if self.raycastValue:
+            self.playerSearch = True
+        if self.playerSearch:
+            self.next_pos = self.game.pathfinding.get_path(self.map_pos, self.game.player.map_pos)
+
+    # Updates the state of the NPC by checking the animation time, locating it on screen, and running the logic.
+    # The sprite itself is projected when the frame is drawn (EntityManager.project).
     def update(self):
         self.checkAnimationTime()
-        self.getSprite()
+        self.locate()
         self.runLogic()
         # self.draw_ray_cast()
 
     # Checks if a given position (x, y) is a wall based on the game's world map
     def checkWall(self, x, y):
-        return (x, y) not in self.game.map.world_map
+        return not self.game.map.is_wall(x, y)
 
     # Checks for collision with walls and adjusts the NPC's position accordingly.
+    # The wall is looked for size steps of one tick ahead, however long this step is.
     def checkWallCollision(self, dx, dy):
-        if self.checkWall(int(self.x + dx * self.size), int(self.y)):
+        scale = self.size * SIM_TICK_TIME / self.game.delta_time
+        if self.checkWall(int(self.x + dx * scale), int(self.y)):
             self.x += dx
-        if self.checkWall(int(self.x), int(self.y + dy * self.size)):
+        if self.checkWall(int(self.x), int(self.y + dy * scale)):
             self.y += dy
+        self.game.entity_manager.spatial_index.move(self)
 
-    # Calculates the next position for the NPC using a pathfinding algorithm and moves the NPC towards that position.
+    # Moves the NPC towards the next position from the pathfinding algorithm.
+    # The path is looked up again as soon as the NPC reaches that tile, without waiting for its next think.
     def movement(self):
-        next_pos = self.game.pathfinding.get_path(self.map_pos, self.game.player.map_pos)
+        if self.next_pos is None or self.next_pos == self.map_pos:
+            self.next_pos = self.game.pathfinding.get_path(self.map_pos, self.game.player.map_pos)
+        next_pos = self.next_pos
         next_x, next_y = next_pos
 
         # pg.draw.rect(self.game.screen, 'blue', (100 * next_x, 100 * next_y, 100, 100))
         if next_pos not in self.game.entity_manager.npc_positions:
             angle = math.atan2(next_y + 0.5 - self.y, next_x + 0.5 - self.x)
-            dx = math.cos(angle) * self.speed
-            dy = math.sin(angle) * self.speed
+            speed = self.speed * self.game.delta_time / SIM_TICK_TIME  # speed is in tiles per tick
+            dx = math.cos(angle) * speed
+            dy = math.sin(angle) * speed
             self.checkWallCollision(dx, dy)
 
     # Triggers an attack action for the NPC.
@@ -80,9 +109,12 @@ class NPC(spriteAnimator):
 
     # Checks if the player's shot intersects with the NPC's sprite.
     # Plays a sound effect and updates the NPC's health and pain status accordingly.
+    # The line of sight is checked again right away, since the last think may be a few frames old.
     def check_hit_in_npc(self):
-        if self.raycastValue and self.game.player.shot:
-            if HALF_WIDTH - self.sprite_half_width < self.screen_x < HALF_WIDTH + self.sprite_half_width:
+        if self.game.player.shot and self in self.game.entity_manager.shot_targets:
+            if HALF_WIDTH - self.sprite_half_width < self.screen_x < HALF_WIDTH + self.sprite_half_width \
+                    and self.can_see_player():
+                self.raycastValue = self.playerSearch = True
                 self.game.sound.npc_pain.play()
                 self.game.player.shot = False
                 self.isPain = True
@@ -94,22 +126,20 @@ class NPC(spriteAnimator):
     def checkHealth(self):
         if self.health < 1:
             self.isAlive = False
+            self.game.entity_manager.spatial_index.kill(self)
             self.game.sound.npc_death.play()
 
     # Executes the main logic for the NPC's behavior.
-    # Checks for player-NPC interaction, such as ray casting to detect the player's presence.
+    # Acts on the player-NPC interaction found by the last think, such as the player's presence.
     # Animates the NPC based on its state and executes the appropriate actions.
     def runLogic(self):
         if self.isAlive:
-            self.raycastValue = self.ray_cast_player_npc()
             self.check_hit_in_npc()
 
             if self.isPain:
                 self.animatePain()
 
             elif self.raycastValue:
-                self.playerSearch = True
-
                 if self.dist < self.attackDistance:
                     self.animate(self.attack_pics)
                     self.attack()
@@ -131,6 +161,14 @@ class NPC(spriteAnimator):
     def map_pos(self):
         return int(self.x), int(self.y)
 
+    # Checks the line of sight to the player; the exact raycast is skipped when the visibility table
+    # says the NPC's tile cannot be seen from the player's tile.
+    def can_see_player(self):
+        if not self.game.visibility.can_see(self.game.player.map_pos, self.map_pos):
+            return False
+        with self.game.profiler.span('NPC.ray_cast_player_npc'):
+            return self.ray_cast_player_npc()
+
     # Performs ray casting to check if there is a line of sight between the NPC and the player.
     # Determines the distances to the player and to walls in both horizontal and vertical directions.
     def ray_cast_player_npc(self):
@@ -142,6 +180,7 @@ class NPC(spriteAnimator):
 
         ox, oy = self.game.player.pos
         x_map, y_map = self.game.player.map_pos
+        tiles, cols, rows = self.game.map.tiles, self.game.map.cols, self.game.map.rows
 
         ray_angle = self.theta
 
@@ -162,7 +201,8 @@ class NPC(spriteAnimator):
             if tile_hor == self.map_pos:
                 playerDist_h = depth_hor
                 break
-            if tile_hor in self.game.map.world_map:
+            tx, ty = tile_hor
+            if 0 <= tx < cols and 0 <= ty < rows and tiles[ty * cols + tx]:  # inlined Map.is_wall
                 wallDist_h = depth_hor
                 break
             x_hor += dx
@@ -183,7 +223,8 @@ class NPC(spriteAnimator):
             if tile_vert == self.map_pos:
                 playerDist_v = depth_vert
                 break
-            if tile_vert in self.game.map.world_map:
+            tx, ty = tile_vert
+            if 0 <= tx < cols and 0 <= ty < rows and tiles[ty * cols + tx]:  # inlined Map.is_wall
                 wallDist_v = depth_vert
                 break
             x_vert += dx
@@ -207,13 +248,17 @@ class NPC(spriteAnimator):
 
 #  represents a range shooter NPC
 class RangeNPC(NPC):
-    def __init__(self, game, path='resources/sprites/npc/rangeNPC/0.png', pos=(10.5, 5.5),
+    sprite_path = 'resources/sprites/npc/rangeNPC/0.png'
+
+    def __init__(self, game, path=sprite_path, pos=(10.5, 5.5),
                  scale=0.6, shift=0.38, animation_time=180):
         super().__init__(game, path, pos, scale, shift, animation_time)
 
 #  represents a melee NPC
 class MeleeNPC(NPC):
-    def __init__(self, game, path='resources/sprites/npc/meleeNPC/0.png', pos=(10.5, 6.5),
+    sprite_path = 'resources/sprites/npc/meleeNPC/0.png'
+
+    def __init__(self, game, path=sprite_path, pos=(10.5, 6.5),
                  scale=0.7, shift=0.27, animation_time=250):
         super().__init__(game, path, pos, scale, shift, animation_time)
         self.attackDistance = 1
@@ -224,7 +269,9 @@ class MeleeNPC(NPC):
 
 #  represents a specific type of boss NPC
 class BossNPC(NPC):
-    def __init__(self, game, path='resources/sprites/npc/bossNPC/0.png', pos=(11.5, 6.0),
+    sprite_path = 'resources/sprites/npc/bossNPC/0.png'
+
+    def __init__(self, game, path=sprite_path, pos=(11.5, 6.0),
                  scale=1.0, shift=0.04, animation_time=210):
         super().__init__(game, path, pos, scale, shift, animation_time)
         self.attack_dist = 6
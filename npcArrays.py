@@ -0,0 +1,376 @@
+import math
+import pygame as pg
+from random import random
+from settings import *
+from npc import NPC
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# frame sets of an NPC type, indexed by the animation state codes below
+FRAME_SETS = ('images', 'attack_pics', 'death_pics', 'idle_pics', 'pain_pics', 'walk_pics')
+BASE, ATTACK, DEATH, IDLE, PAIN, WALK = range(len(FRAME_SETS))
+
+# per NPC columns and their types
+COLUMNS = {
+    'x': float, 'y': float, 'dist': float, 'theta': float, 'screen_x': float, 'norm_dist': float,
+    'speed': float, 'accuracy': float, 'size': float, 'attack_distance': float,
+    'health': int, 'attack_damage': int, 'sprite_half_width': int, 'type': int,
+    'image_set': int, 'image_frame': int, 'death_frames': int, 'next_x': int, 'next_y': int,
+    'animation_time': int, 'animation_prev': int,
+    'alive': bool, 'pain': bool, 'raycast': bool, 'search': bool, 'trigger': bool,
+}
+
+
+# Structure of arrays NPC storage (NPC_BACKEND = 'arrays'). The state of every NPC (position, health,
+# behaviour flags, animation timers and its own stats) lives in one NumPy array per attribute, and
+# the per tick work of NPC.update (animation timers, distance and screen position,
+# movement, wall collision and animation frames) runs as array operations over all NPCs at once;
+# only the NPCs that are on screen, attacking or reaching their next tile are visited one by one.
+# NPCs are still created as NPC objects, which set the stats of their type, and are then absorbed:
+# the frames are kept once per type and the gameplay code gets an NPCView of the NPC instead.
+class NPCArrays:
+    supported = np is not None
+
+    def __init__(self, game, capacity=64):
+        self.game = game
+        self.count = 0
+        self.views = []
+        self.types = {}  # NPC class -> type id
+        self.frames = []  # type id -> frame tuples by animation state
+        self.metrics = []  # type id -> (scale, height shift, image ratio, image half width)
+        self.assets = []  # images acquired by the first NPC of every type
+        for name, kind in COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, kind))
+        self.frame_counts = np.zeros((capacity, len(FRAME_SETS)), int)  # animation steps by state
+
+    # Grows every column to capacity, keeping the NPCs stored so far.
+    def allocate(self, capacity):
+        for name in list(COLUMNS) + ['frame_counts']:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    # Stores an NPC object and returns the view that replaces it.
+    def add(self, npc):
+        type_id = self.add_type(npc)
+        i = self.count
+        if i == len(self.x):
+            self.allocate(2 * i)
+        self.count += 1
+        self.x[i], self.y[i] = npc.x, npc.y
+        self.speed[i], self.accuracy[i], self.size[i] = npc.speed, npc.accuracy, npc.size
+        self.attack_distance[i], self.attack_damage[i] = npc.attackDistance, npc.attackDamage
+        self.health[i], self.alive[i] = npc.health, npc.isAlive
+        self.dist[i], self.norm_dist[i] = npc.dist, npc.norm_dist
+        self.type[i] = type_id
+        self.image_set[i] = BASE
+        self.next_x[i] = self.next_y[i] = -1
+        self.animation_time[i], self.animation_prev[i] = npc.animation_time, npc.animation_time_prev
+        view = NPCView(self, i)
+        self.views.append(view)
+        return view
+
+    # Returns the type id of an NPC, registering its frames and sprite metrics the first time.
+    # Later NPCs of a type give their frames back, since they share the first one's.
+    def add_type(self, npc):
+        type_id = self.types.get(type(npc))
+        if type_id is not None:
+            npc.release()
+            return type_id
+        type_id = self.types[type(npc)] = len(self.frames)
+        self.frames.append([(npc.image,)] + [tuple(getattr(npc, name)) for name in FRAME_SETS[1:]])
+        self.metrics.append((npc.SPRITE_SCALE, npc.SPRITE_HEIGHT_SHIFT, npc.IMAGE_RATIO, npc.IMAGE_HALF_WIDTH))
+        self.assets.extend(npc.assets)
+        self.type_scale, self.type_shift, self.type_ratio, self.type_half_width = map(np.array, zip(*self.metrics))
+        self.type_lengths = np.array([[len(frames) for frames in sets] for sets in self.frames])
+        return type_id
+
+    # Returns the current image of NPC i.
+    def get_image(self, i):
+        return self.frames[self.type[i]][self.image_set[i]][self.image_frame[i]]
+
+    # Returns the tiles of the map as a rows x cols array, nonzero for walls (the map's own grid,
+    # so it is always current).
+    def get_walls(self):
+        return self.game.map.grid
+
+    # Returns which of the tiles (tx, ty) are walls, like NPC.checkWall; tiles off the map are not.
+    def is_wall(self, tx, ty):
+        walls = self.get_walls()
+        rows, cols = walls.shape
+        inside = (tx >= 0) & (tx < cols) & (ty >= 0) & (ty < rows)
+        return inside & (walls[ty.clip(0, rows - 1), tx.clip(0, cols - 1)] != 0)
+
+    # Lets the due NPCs think and updates every NPC, as AIScheduler.update does one by one.
+    # Only the NPCs in the simulated chunks of the world think and act (see WorldChunks).
+    def update(self):
+        if not self.count:
+            return
+        simulated = self.get_simulated()
+        self.game.entity_manager.scheduler.think(self.get_views(simulated))
+        with self.game.profiler.span('NPCArrays.update'):
+            self.check_animation_time()
+            self.locate()
+            self.check_hits()
+            self.run_logic(simulated)
+
+    # Returns which NPCs are simulated this tick.
+    def get_simulated(self):
+        n = self.count
+        return self.game.world.get_simulated_mask(self.x[:n], self.y[:n])
+
+    def get_views(self, mask):
+        if mask.all():
+            return self.views
+        return [self.views[i] for i in np.flatnonzero(mask)]
+
+    # Projects the NPCs for rendering, see EntityManager.project.
+    def project(self):
+        if self.count:
+            for i in np.flatnonzero(self.locate()):
+                self.get_sprite_projection(i)
+
+    def get_ticks(self):
+        return pg.time.get_ticks()
+
+    def check_animation_time(self):
+        n = self.count
+        time_now = self.get_ticks()
+        trigger = time_now - self.animation_prev[:n] > self.animation_time[:n]
+        self.animation_prev[:n][trigger] = time_now
+        self.trigger[:n] = trigger
+
+    # Computes the distance, screen position and drawn half width of every NPC without scaling their
+    # images, like SpriteObject.locate. Returns which NPCs are to be drawn.
+    def locate(self):
+        n = self.count
+        player = self.game.player
+        x, y = self.x[:n], self.y[:n]
+        dx, dy = self.get_distances()
+        seen = self.game.visibility.visible_from(player.map_pos)
+        if seen is None:
+            seen = np.ones(n, bool)
+        else:
+            seen = seen[y.astype(np.intp) * self.game.map.cols + x.astype(np.intp)]
+        self.sprite_half_width[:n][~seen] = 0
+
+        theta = np.arctan2(dy, dx)
+        delta = theta - player.angle
+        delta[(dx > 0) & (player.angle > math.pi) | (dx < 0) & (dy < 0)] += math.tau
+        screen_x = (HALF_NUM_RAYS + delta / DELTA_ANGLE) * SCALE
+        norm_dist = self.dist[:n] * np.cos(delta)
+        self.theta[:n][seen] = theta[seen]
+        self.screen_x[:n][seen] = screen_x[seen]
+        self.norm_dist[:n][seen] = norm_dist[seen]
+
+        half_width = self.type_half_width[self.type[:n]]
+        on_screen = seen & (-half_width < screen_x) & (screen_x < WIDTH + half_width) & (norm_dist > 0.5)
+        get_scaled_size = self.game.object_renderer.sprite_cache.get_scaled_size
+        for i in np.flatnonzero(on_screen):
+            type_id = self.type[i]
+            proj = SCREEN_DIST / float(norm_dist[i]) * self.type_scale[type_id]
+            self.sprite_half_width[i] = get_scaled_size(proj, self.type_ratio[type_id])[0] // 2
+        return on_screen
+
+    # Updates the distance of every NPC to the player and returns the offsets (dx, dy).
+    def get_distances(self):
+        n = self.count
+        dx, dy = self.x[:n] - self.game.player.x, self.y[:n] - self.game.player.y
+        self.dist[:n] = np.hypot(dx, dy)
+        return dx, dy
+
+    def get_sprite_projection(self, i):
+        type_id = self.type[i]
+        norm_dist = float(self.norm_dist[i])
+        proj = SCREEN_DIST / norm_dist * self.type_scale[type_id]
+        image = self.game.object_renderer.sprite_cache.get_scaled(self.get_image(i), proj, self.type_ratio[type_id])
+        proj_width, proj_height = image.get_size()
+
+        self.sprite_half_width[i] = proj_width // 2
+        height_shift = proj_height * self.type_shift[type_id]
+        pos = self.screen_x[i] - proj_width // 2, HALF_HEIGHT - proj_height // 2 + height_shift
+
+        self.game.raycasting.sprites_to_render.append((norm_dist, image, pos))
+
+    # Applies the player's shot to the first living NPC under the crosshair, like NPC.check_hit_in_npc.
+    # Only the NPCs near the line of fire (EntityManager.shot_targets) are looked at.
+    def check_hits(self):
+        player = self.game.player
+        for view in sorted(self.game.entity_manager.shot_targets, key=lambda view: view.index):
+            i = view.index
+            if not player.shot:
+                break
+            if self.alive[i] and HALF_WIDTH - self.sprite_half_width[i] < self.screen_x[i] \
+                    < HALF_WIDTH + self.sprite_half_width[i] and view.can_see_player():
+                self.hit(i)
+
+    def hit(self, i):
+        self.raycast[i] = self.search[i] = True
+        self.game.sound.npc_pain.play()
+        self.game.player.shot = False
+        self.pain[i] = True
+        self.health[i] -= self.game.weapon.damage
+        self.check_health(i)
+
+    def check_health(self, i):
+        if self.health[i] < 1:
+            self.alive[i] = False
+            self.game.entity_manager.spatial_index.kill(self.views[i])
+            self.game.sound.npc_death.play()
+
+    # Picks what every simulated NPC does this tick from the state left by the last think, like
+    # NPC.runLogic.
+    def run_logic(self, simulated):
+        n = self.count
+        alive, trigger = self.alive[:n], self.trigger[:n]
+        pain = alive & self.pain[:n] & simulated
+        active = alive & ~self.pain[:n] & simulated
+        attack = active & self.raycast[:n] & (self.dist[:n] < self.attack_distance[:n])
+        walk = active & ~attack & (self.raycast[:n] | self.search[:n])
+        idle = active & ~attack & ~walk
+
+        self.animate(PAIN, pain & trigger)
+        self.pain[:n][pain & trigger] = False
+        self.animate(ATTACK, attack & trigger)
+        self.attack(np.flatnonzero(attack & trigger))
+        self.animate(WALK, walk & trigger)
+        self.movement(np.flatnonzero(walk))
+        self.animate(IDLE, idle & trigger)
+        self.animate_death(~alive)
+
+    # Steps the frames of one animation state for the NPCs in mask, like spriteAnimator.animate.
+    def animate(self, state, mask):
+        index = np.flatnonzero(mask)
+        if not index.size:
+            return
+        counts = self.frame_counts[index, state] + 1
+        self.frame_counts[index, state] = counts
+        self.image_set[index] = state
+        self.image_frame[index] = counts % self.type_lengths[self.type[index], state]
+
+    def animate_death(self, mask):
+        if not self.game.global_trigger:
+            return
+        index = np.flatnonzero(mask)
+        index = index[self.death_frames[index] < self.type_lengths[self.type[index], DEATH] - 1]
+        self.death_frames[index] += 1
+        self.image_set[index] = DEATH
+        self.image_frame[index] = self.death_frames[index]
+
+    def attack(self, index):
+        for i in index:
+            self.game.sound.npc_shot.play()
+            if random() < self.accuracy[i]:
+                self.game.player.get_damage(int(self.attack_damage[i]))
+
+    # Moves the NPCs in index towards their next tile, like NPC.movement. The NPCs that reached it
+    # look the path up again; tiles are taken as occupied by where the NPCs stood at the frame start.
+    def movement(self, index):
+        if not index.size:
+            return
+        x, y = self.x[index], self.y[index]
+        next_x, next_y = self.next_x[index], self.next_y[index]
+        arrived = (next_x < 0) | (next_x == x.astype(np.intp)) & (next_y == y.astype(np.intp))
+        if arrived.any():
+            player_pos = self.game.player.map_pos
+            for i in index[arrived]:
+                view = self.views[i]
+                view.next_pos = self.game.pathfinding.get_path(view.map_pos, player_pos)
+            next_x, next_y = self.next_x[index], self.next_y[index]
+
+        walls = self.get_walls()
+        occupied = np.zeros(walls.shape, bool)
+        alive = self.alive[:self.count]
+        occupied[self.y[:self.count][alive].astype(np.intp), self.x[:self.count][alive].astype(np.intp)] = True
+        free = ~occupied[next_y, next_x]
+        index, x, y, next_x, next_y = index[free], x[free], y[free], next_x[free], next_y[free]
+
+        angle = np.arctan2(next_y + 0.5 - y, next_x + 0.5 - x)
+        speed = self.speed[index] * (self.game.delta_time / SIM_TICK_TIME)
+        self.check_wall_collision(index, np.cos(angle) * speed, np.sin(angle) * speed)
+
+    # Moves the NPCs in index by (dx, dy) where no wall is in the way, like NPC.checkWallCollision,
+    # and refiles the ones that changed tile in the spatial index.
+    def check_wall_collision(self, index, dx, dy):
+        x, y = self.x[index], self.y[index]
+        size = self.size[index] * (SIM_TICK_TIME / self.game.delta_time)
+        old_x, old_y = x.astype(np.intp), y.astype(np.intp)
+        x = np.where(self.is_wall((x + dx * size).astype(np.intp), old_y), x, x + dx)
+        y = np.where(self.is_wall(x.astype(np.intp), (y + dy * size).astype(np.intp)), y, y + dy)
+        self.x[index], self.y[index] = x, y
+        moved = (x.astype(np.intp) != old_x) | (y.astype(np.intp) != old_y)
+        for i in index[moved]:
+            self.game.entity_manager.spatial_index.move(self.views[i])
+
+    # Gives the frames held for every NPC type back to the asset registry.
+    def release(self):
+        self.game.assets.release_all(self.assets)
+        self.assets = []
+
+
+# Returns a property reading and writing one column of the NPC's store as a Python value.
+def column(name, kind):
+    def get(view):
+        return kind(getattr(view.store, name)[view.index])
+
+    def set(view, value):
+        getattr(view.store, name)[view.index] = value
+    return property(get, set)
+
+
+# An NPC stored in NPCArrays, with the attributes and methods of NPC that the gameplay code uses
+# (the AI scheduler, pathfinding, spatial index and visibility checks), backed by the store's columns.
+# NPC's think and line of sight methods are shared as they are.
+class NPCView:
+    __slots__ = ('store', 'index', 'game', 'player', 'next_think')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.game = store.game
+        self.player = store.game.player
+        self.next_think = 0  # game time of the next think, set by the AI scheduler
+
+    x = column('x', float)
+    y = column('y', float)
+    dist = column('dist', float)
+    theta = column('theta', float)
+    screen_x = column('screen_x', float)
+    sprite_half_width = column('sprite_half_width', int)
+    health = column('health', int)
+    speed = column('speed', float)
+    accuracy = column('accuracy', float)
+    attackDistance = column('attack_distance', float)
+    attackDamage = column('attack_damage', int)
+    isAlive = column('alive', bool)
+    isPain = column('pain', bool)
+    raycastValue = column('raycast', bool)
+    playerSearch = column('search', bool)
+
+    think = NPC.think
+    can_see_player = NPC.can_see_player
+    ray_cast_player_npc = NPC.ray_cast_player_npc
+    map_pos = NPC.map_pos
+
+    # The next tile towards the player, from the last path lookup.
+    @property
+    def next_pos(self):
+        if self.store.next_x[self.index] < 0:
+            return None
+        return int(self.store.next_x[self.index]), int(self.store.next_y[self.index])
+
+    @next_pos.setter
+    def next_pos(self, pos):
+        self.store.next_x[self.index], self.store.next_y[self.index] = pos if pos is not None else (-1, -1)
+
+    @property
+    def image(self):
+        return self.store.get_image(self.index)
+
+    # The frames are held by the store, see NPCArrays.release.
+    def release(self):
+        pass
@@ -0,0 +1,342 @@
+import multiprocessing
+import queue
+import time
+import weakref
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+from random import random
+from settings import *
+from map import Map
+from mapFile import MapFile
+from visibility import VisibilityTable
+from graphNavigator import GraphNavigator
+from aiScheduler import AIScheduler
+from profiler import Profiler
+from spatialIndex import SpatialGrid
+from worldChunks import WorldChunks
+from npcArrays import NPCArrays, NPCView, COLUMNS, np
+
+# control words at the start of the shared memory block
+# latest complete buffer, sequence numbers and NPC counts of both buffers, steps run
+LATEST, SEQUENCE, COUNT, STEPS = 0, 1, 3, 5
+CONTROL_WORDS = 6
+POSE_WORDS = 3  # player x, y and angle
+# columns the worker publishes in every snapshot
+SNAPSHOT_COLUMNS = ('x', 'y', 'alive', 'image_set', 'image_frame')
+
+
+# Returns the control words, the player pose and the two snapshot buffers laid over a shared memory
+# buffer for capacity NPCs. Both processes build the same views from it.
+def get_layout(buffer, capacity):
+    control = np.ndarray(CONTROL_WORDS, np.int64, buffer)
+    pose = np.ndarray(POSE_WORDS, np.float64, buffer, control.nbytes)
+    offset = control.nbytes + pose.nbytes
+    snapshots = []
+    for _ in range(2):
+        snapshot = {}
+        for name in SNAPSHOT_COLUMNS:
+            column = snapshot[name] = np.ndarray(capacity, COLUMNS[name], buffer, offset)
+            offset += -(-column.nbytes // 8) * 8
+        snapshots.append(snapshot)
+    return control, pose, snapshots
+
+
+# Returns the size in bytes of the shared memory block for capacity NPCs.
+def get_layout_size(capacity):
+    size = (CONTROL_WORDS + POSE_WORDS) * 8
+    for name in SNAPSHOT_COLUMNS:
+        size += 2 * -(-capacity * np.dtype(COLUMNS[name]).itemsize // 8) * 8
+    return size
+
+
+# NPC storage of the main process when NPC_WORKER is on. The NPCs are simulated (thinking, moving,
+# attacking and animating) by NPCSimulation in a worker process, which publishes their positions and
+# current frames into one of two snapshot buffers in shared memory and then flips to it; every frame
+# this store copies the last complete snapshot, guarded by the buffer's sequence number, and only
+# projects the sprites and checks the player's shot. The player pose goes the other way through the
+# same block; hits and map changes are sent to the worker on a queue, and the worker sends back the
+# NPC attacks, so the render frame time does not depend on the number of NPCs.
+class NPCWorker(NPCArrays):
+    def __init__(self, game):
+        super().__init__(game)
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.memory = None
+        self.commands = self.events = None
+        self.map_version = game.map.version
+        self.steps = 0
+
+    # Starts the worker with the NPCs stored so far; NPCs added later are sent to it.
+    def start(self):
+        self.capacity = max(NPC_WORKER_CAPACITY, self.count)
+        self.memory = shared_memory.SharedMemory(create=True, size=get_layout_size(self.capacity))
+        self.control, self.pose, self.snapshots = get_layout(self.memory.buf, self.capacity)
+        self.control[LATEST] = -1
+        self.write_pose()
+        self.commands, self.events = self.context.Queue(), self.context.Queue()
+        state = {name: getattr(self, name)[:self.count].copy() for name in COLUMNS}
+        state['frame_counts'] = self.frame_counts[:self.count].copy()
+        self.process = self.context.Process(
+            target=run_simulation, name='npc-worker', daemon=True,
+            args=(self.memory.name, self.capacity, self.game.map_choice, bytes(self.game.map.data.buffer),
+                  state, self.type_lengths, self.get_ticks(), self.commands, self.events))
+        self.process.start()
+        # also stops the worker and frees the memory when the game exits without releasing the level
+        self.finalizer = weakref.finalize(self, stop_worker, self.process, self.commands, self.memory)
+
+    def add(self, npc):
+        if self.process is not None and self.count == self.capacity:
+            raise RuntimeError(f'more than {self.capacity} NPCs for the NPC worker (NPC_WORKER_CAPACITY)')
+        view = super().add(npc)
+        if self.process is not None:
+            state = {name: getattr(self, name)[view.index] for name in COLUMNS}
+            self.commands.put(('add', state, self.type_lengths))
+        return view
+
+    # Sends the player pose and the latest hits and map changes, reads the last snapshot and the
+    # worker's events, and renders the NPCs from it.
+    def update(self):
+        if not self.count:
+            return
+        if self.process is None:
+            self.start()
+        with self.game.profiler.span('NPCWorker.sync'):
+            self.write_pose()
+            self.send_map_changes()
+            self.read_snapshot()
+            self.read_events()
+        with self.game.profiler.span('NPCArrays.update'):
+            self.locate()
+            self.check_hits()
+
+    def write_pose(self):
+        player = self.game.player
+        self.pose[:] = player.x, player.y, player.angle
+
+    def send_map_changes(self):
+        if self.map_version == self.game.map.version:
+            return
+        changes = self.game.map.changes_since(self.map_version)
+        if changes is None:
+            changes = [(x, y) for y in range(self.game.map.rows) for x in range(self.game.map.cols)]
+        self.commands.put(('tiles', [(x, y, self.game.map.get_tile(x, y)) for x, y in changes]))
+        self.map_version = self.game.map.version
+
+    # Copies the last complete snapshot. The worker bumps a buffer's sequence number before and
+    # after writing it, so an odd or changed number means the copy may be torn and is retried.
+    # NPCs the worker has not been told about yet keep their state.
+    def read_snapshot(self):
+        for _ in range(3):
+            latest = self.control[LATEST]
+            if latest < 0:
+                return  # the worker has not finished its first step yet
+            sequence = self.control[SEQUENCE + latest]
+            if sequence & 1:
+                continue
+            n = min(self.count, self.control[COUNT + latest])
+            snapshot = self.snapshots[latest]
+            columns = {name: snapshot[name][:n].copy() for name in SNAPSHOT_COLUMNS}
+            if self.control[SEQUENCE + latest] == sequence:
+                break
+        else:
+            return
+        old_x, old_y = self.x[:n].astype(np.intp), self.y[:n].astype(np.intp)
+        killed = self.alive[:n] & ~columns['alive']
+        for name, column in columns.items():
+            getattr(self, name)[:n] = column
+        self.steps = int(self.control[STEPS])
+        moved = (self.x[:n].astype(np.intp) != old_x) | (self.y[:n].astype(np.intp) != old_y)
+        spatial_index = self.game.entity_manager.spatial_index
+        for i in np.flatnonzero(moved):
+            spatial_index.move(self.views[i])
+        for i in np.flatnonzero(killed):
+            spatial_index.kill(self.views[i])
+            self.game.sound.npc_death.play()
+
+    # Plays the NPC attacks the worker reported and applies their damage.
+    def read_events(self):
+        while True:
+            try:
+                event, damage = self.events.get_nowait()
+            except queue.Empty:
+                return
+            if self.process is None:
+                return  # the attack ended the game and the level was released
+            if event == 'attack':
+                self.game.sound.npc_shot.play()
+                if damage:
+                    self.game.player.get_damage(damage)
+
+    # Sends the hit to the worker, which applies the damage; the NPC dies once a snapshot says so.
+    def hit(self, i):
+        self.game.sound.npc_pain.play()
+        self.game.player.shot = False
+        self.commands.put(('hit', int(i), self.game.weapon.damage))
+
+    # Stops the worker and frees the shared memory.
+    def release(self):
+        super().release()
+        if self.process is None:
+            return
+        self.finalizer()
+        self.process = None
+        del self.control, self.pose, self.snapshots
+        self.memory.close()
+
+
+def stop_worker(process, commands, memory):
+    commands.put(('stop',))
+    process.join(1)
+    if process.is_alive():
+        process.terminate()
+    memory.unlink()
+
+
+# The player as the worker sees it: the pose published by the main process.
+class PlayerPose:
+    def __init__(self, pose):
+        self.pose = pose
+        self.x, self.y, self.angle = pose
+
+    def read(self):
+        self.x, self.y, self.angle = self.pose.tolist()
+
+    @property
+    def pos(self):
+        return self.x, self.y
+
+    @property
+    def map_pos(self):
+        return int(self.x), int(self.y)
+
+
+# NPC storage of the worker process: runs the AI scheduler and the logic part of NPCArrays.update
+# on its own game state (map, visibility, pathfinding and spatial index) and also stands in for the
+# entity manager there. It holds no frames, only how many frames each animation has.
+class NPCSimulation(NPCArrays):
+    def __init__(self, game, state, type_lengths, start_ticks, events):
+        super().__init__(game, max(1, len(state['x'])))
+        self.type_lengths = type_lengths
+        self.start_ticks = start_ticks
+        self.start_time = time.perf_counter()
+        self.events = events
+        self.spatial_index = SpatialGrid(game.map.cols, game.map.rows)
+        self.npc_positions = self.spatial_index.occupied
+        self.shot_targets = set()
+        self.scheduler = AIScheduler(game)
+        self.add_state(state)
+
+    @property
+    def occupancy_version(self):
+        return self.spatial_index.version
+
+    # Appends NPCs given as columns of values.
+    def add_state(self, state, type_lengths=None):
+        if type_lengths is not None:
+            self.type_lengths = type_lengths
+        added = len(np.atleast_1d(state['x']))
+        if self.count + added > len(self.x):
+            self.allocate(max(2 * len(self.x), self.count + added))
+        for name, values in state.items():
+            if name in COLUMNS or name == 'frame_counts':
+                getattr(self, name)[self.count:self.count + added] = values
+        for i in range(self.count, self.count + added):
+            view = NPCView(self, i)
+            self.views.append(view)
+            self.spatial_index.add(view)
+        self.count += added
+
+    def get_ticks(self):
+        return self.start_ticks + int((time.perf_counter() - self.start_time) * 1000)
+
+    # Runs one simulation step, like NPCArrays.update without the sprites.
+    def step(self):
+        self.game.world.update()
+        if not self.count:
+            return
+        simulated = self.get_simulated()
+        self.scheduler.begin_frame()
+        self.scheduler.think(self.get_views(simulated))
+        self.check_animation_time()
+        self.get_distances()
+        self.run_logic(simulated)
+
+    # Applies a hit sent by the main process.
+    def apply_hit(self, i, damage):
+        if not self.alive[i]:
+            return
+        self.raycast[i] = self.search[i] = True
+        self.pain[i] = True
+        self.health[i] -= damage
+        if self.health[i] < 1:
+            self.alive[i] = False
+            self.spatial_index.kill(self.views[i])
+
+    # Reports the attacks to the main process, which plays them and applies their damage.
+    def attack(self, index):
+        for i in index:
+            damage = int(self.attack_damage[i]) if random() < self.accuracy[i] else 0
+            self.events.put(('attack', damage))
+
+    def write_snapshot(self, snapshot):
+        n = self.count
+        for name in SNAPSHOT_COLUMNS:
+            snapshot[name][:n] = getattr(self, name)[:n]
+
+
+# Entry point of the worker process: builds the simulation from the state of the main process and
+# steps it every NPC_WORKER_STEP milliseconds until told to stop.
+def run_simulation(memory_name, capacity, map_num, map_data, state, type_lengths, start_ticks, commands, events):
+    memory = shared_memory.SharedMemory(name=memory_name)
+    control, pose, snapshots = get_layout(memory.buf, capacity)
+    game = SimpleNamespace(delta_time=NPC_WORKER_STEP, global_trigger=False, profiler=Profiler())
+    game.map = Map(game, map_num, MapFile(bytearray(map_data)))
+    game.player = PlayerPose(pose)
+    game.world = WorldChunks(game)
+    game.visibility = VisibilityTable(game)
+    simulation = game.entity_manager = NPCSimulation(game, state, type_lengths, start_ticks, events)
+    game.pathfinding = GraphNavigator(game)
+
+    step_time = NPC_WORKER_STEP / 1000
+    last_step = next_trigger = time.perf_counter()
+    buffer = 0
+    running = True
+    while running:
+        while True:
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                break
+            if command[0] == 'hit':
+                simulation.apply_hit(command[1], command[2])
+            elif command[0] == 'tiles':
+                for x, y, value in command[1]:
+                    game.map.set_tile(x, y, value)
+            elif command[0] == 'add':
+                simulation.add_state(command[1], command[2])
+            elif command[0] == 'stop':
+                running = False
+
+        now = time.perf_counter()
+        game.delta_time = (now - last_step) * 1000
+        last_step = now
+        game.global_trigger = now >= next_trigger  # the global trigger of the main loop
+        if game.global_trigger:
+            next_trigger = now + GLOBAL_TRIGGER_TIME / 1000
+        game.player.read()
+        simulation.step()
+
+        # write the buffer the main process is not reading, then flip to it
+        buffer = 1 - buffer
+        control[SEQUENCE + buffer] += 1
+        simulation.write_snapshot(snapshots[buffer])
+        control[COUNT + buffer] = simulation.count
+        control[SEQUENCE + buffer] += 1
+        control[LATEST] = buffer
+        control[STEPS] += 1
+
+        time.sleep(max(0.0, last_step + step_time - time.perf_counter()))
+
+    game.player.pose = None
+    del control, pose, snapshots
+    memory.close()
@@ -1,13 +1,15 @@
 from settings import *
 import pygame as pg
 import math
+from contextlib import contextmanager
 
 # Represents the player character in the game.
 class Player:
     def __init__(self, game):
         self.game = game
-        self.x, self.y = PLAYER_POS
+        self.x, self.y = game.map.player_pos
         self.angle = PLAYER_ANGLE
+        self.prev_pose = self.x, self.y, self.angle  # pose at the start of the last tick, see interpolated
         self.shot = False
         self.health = PLAYER_MAX_HEALTH
         self.rel = 0
@@ -60,7 +62,7 @@ class Player:
         speed_sin = speed * sin_a
         speed_cos = speed * cos_a
 
-        keys = pg.key.get_pressed()
+        keys = self.game.scripted_input.get_pressed() if self.game.scripted_input else pg.key.get_pressed()
         num_key_pressed = -1
         if keys[pg.K_w]:
             num_key_pressed += 1
@@ -94,7 +96,7 @@ class Player:
 
     # Checks if a wall exists at the given coordinates (x, y) in the game's map.
     def check_wall(self, x, y):
-        return (x, y) not in self.game.map.world_map
+        return not self.game.map.is_wall(x, y)
 
     # Checks for collisions with walls based on the player's intended movement (dx, dy). Adjusts the player's position to prevent moving through walls.
     def check_wall_collision(self, dx, dy):
@@ -113,19 +115,37 @@ class Player:
 
     # Controls the player's rotation based on mouse movement. Sets the mouse position to the center of the screen if it exceeds the defined borders. Updates the player's angle based on the mouse's relative movement.
     def mouse_control(self):
-        mx, my = pg.mouse.get_pos()
-        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
-            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
-        self.rel = pg.mouse.get_rel()[0]
+        if self.game.scripted_input:
+            self.rel = self.game.scripted_input.get_rel()[0]
+        else:
+            mx, my = pg.mouse.get_pos()
+            if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
+                pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
+            self.rel = pg.mouse.get_rel()[0]
         self.rel = max(-MOUSE_MAX_REL, min(MOUSE_MAX_REL, self.rel))
         self.angle += self.rel * MOUSE_SENSITIVITY * self.game.delta_time
 
     # Updates the player's position and other attributes.
     def update(self):
+        self.prev_pose = self.x, self.y, self.angle
         self.movement()
         self.mouse_control()
         self.recover_health()
 
+    # Puts the player at the pose a fraction alpha of the way from the start of the last tick to its end
+    # while the frame is rendered, and back afterwards.
+    @contextmanager
+    def interpolated(self, alpha):
+        pose = self.x, self.y, self.angle
+        x, y, angle = self.prev_pose
+        turn = (self.angle - angle + math.pi) % math.tau - math.pi
+        self.x, self.y = x + (self.x - x) * alpha, y + (self.y - y) * alpha
+        self.angle = (angle + turn * alpha) % math.tau
+        try:
+            yield
+        finally:
+            self.x, self.y, self.angle = pose
+
     # Property that returns the player's current position as a tuple (x, y).
     @property
     def pos(self):
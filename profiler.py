@@ -0,0 +1,154 @@
+import pygame as pg
+import json
+import time
+from settings import *
+
+
+# Does nothing; returned by Profiler.span while profiling is off so instrumented code stays cheap.
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+# Times one named block of code and hands the sample to the profiler when the block ends.
+class Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+# Collects named timing spans into a fixed-size ring buffer, keeps a history of frame times,
+# draws an overlay with a frame time graph and per-span breakdown, and exports the samples
+# as Chrome trace-event JSON (load it in chrome://tracing or ui.perfetto.dev).
+class Profiler:
+    def __init__(self, capacity=PROFILER_CAPACITY, frame_history=PROFILER_FRAMES):
+        self.enabled = PROFILER_ENABLED
+        self.overlay_visible = False
+        self.capacity = capacity
+        self.names = [None] * capacity
+        self.starts = [0] * capacity
+        self.durations = [0] * capacity
+        self.sample_frames = [0] * capacity
+        self.index = 0
+        self.count = 0
+
+        self.frame = 0
+        self.frame_start = 0
+        self.frame_history = frame_history
+        self.frame_times = [0.0] * frame_history
+        self.frame_index = 0
+        self.font = None
+        self.epoch = time.perf_counter_ns()
+
+    # Returns a context manager timing the block under the given name.
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    # Stores one sample, overwriting the oldest once the buffer is full.
+    def record(self, name, start, duration):
+        i = self.index
+        self.names[i] = name
+        self.starts[i] = start
+        self.durations[i] = duration
+        self.sample_frames[i] = self.frame
+        self.index = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    # Marks the start of a frame; frames that start while profiling is off are not recorded.
+    def begin_frame(self):
+        self.frame_start = time.perf_counter_ns() if self.enabled else 0
+
+    # Records the frame, unless profiling was off when it started (it was switched on mid-frame).
+    def end_frame(self):
+        if self.enabled and self.frame_start:
+            duration = time.perf_counter_ns() - self.frame_start
+            self.record('frame', self.frame_start, duration)
+            self.frame_times[self.frame_index] = duration / 1e6
+            self.frame_index = (self.frame_index + 1) % self.frame_history
+            self.frame += 1
+
+    # Shows or hides the overlay; profiling is switched on while the overlay is visible.
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.enabled = self.overlay_visible or PROFILER_ENABLED
+
+    # Yields the stored samples from oldest to newest as (name, start, duration, frame).
+    def samples(self):
+        first = (self.index - self.count) % self.capacity
+        for n in range(self.count):
+            i = (first + n) % self.capacity
+            yield self.names[i], self.starts[i], self.durations[i], self.sample_frames[i]
+
+    # Returns the average milliseconds per frame spent in each span over the last frames.
+    # Walks the ring buffer from the newest sample back, so only those frames are visited.
+    def breakdown(self, frames=60):
+        first_frame = self.frame - frames
+        totals = {}
+        for n in range(1, self.count + 1):
+            i = (self.index - n) % self.capacity
+            if self.sample_frames[i] < first_frame:
+                break
+            name = self.names[i]
+            if name != 'frame':
+                totals[name] = totals.get(name, 0) + self.durations[i]
+        counted = max(1, min(frames, self.frame))
+        return sorted(((name, total / 1e6 / counted) for name, total in totals.items()),
+                      key=lambda t: t[1], reverse=True)
+
+    # Draws the last frame times as bars (the line marks 60 fps) and the per-span breakdown.
+    def draw_overlay(self, screen):
+        if not self.overlay_visible:
+            return
+        if self.font is None:
+            self.font = pg.font.SysFont('monospace', 16)
+        graph_height, scale_ms = 100, 50
+        left, top = WIDTH - self.frame_history - 10, 10
+        pg.draw.rect(screen, (0, 0, 0), (left, top, self.frame_history, graph_height))
+        for n in range(self.frame_history):
+            frame_time = self.frame_times[(self.frame_index + n) % self.frame_history]
+            bar = min(graph_height, frame_time / scale_ms * graph_height)
+            color = (0, 200, 0) if frame_time < 1000 / 60 else (220, 60, 0)
+            pg.draw.line(screen, color, (left + n, top + graph_height), (left + n, top + graph_height - bar))
+        target = top + graph_height - (1000 / 60) / scale_ms * graph_height
+        pg.draw.line(screen, (255, 255, 255), (left, target), (left + self.frame_history, target))
+
+        y = top + graph_height + 4
+        for name, ms in self.breakdown():
+            text = self.font.render(f'{name:<34}{ms:7.2f} ms', True, (255, 255, 255), (0, 0, 0))
+            screen.blit(text, (WIDTH - text.get_width() - 10, y))
+            y += text.get_height()
+
+    # Writes the stored samples as Chrome trace-event JSON.
+    def export_chrome_trace(self, path=PROFILER_TRACE_PATH):
+        events = [{
+            'name': name,
+            'ph': 'X',
+            'ts': (start - self.epoch) / 1000,
+            'dur': duration / 1000,
+            'pid': 0,
+            'tid': 0,
+            'args': {'frame': frame},
+        } for name, start, duration, frame in self.samples()]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return path
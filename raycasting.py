@@ -1,47 +1,61 @@
 import pygame as pg
 import math
+from types import SimpleNamespace
 from settings import *
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 #  handles the ray casting algorithm for rendering the 3D scene in the game.
 # It stores the results of ray casting, including depth, projected height, texture, and offset.
 class RayCasting:
     def __init__(self, game):
         self.game = game
         self.ray_casting_result = []
-        self.objects_to_render = []
+        self.depth_buffer = []
+        self.walls_to_render = []
+        self.sprites_to_render = []
         self.textures = self.game.object_renderer.wall_textures
+        self.backends = {'python': self.ray_cast_python, 'numpy': self.ray_cast_numpy}
+        self.backend = RAYCAST_BACKEND if np is not None else 'python'
+
+    # The map's tile grid indexed as [x, y], where 0 is an empty tile and any other value is the
+    # wall texture id. It is a view, so changed tiles show up without rebuilding anything.
+    @property
+    def wall_grid(self):
+        return self.game.map.grid.T
 
 
-    #  prepares the objects to be rendered based on the ray casting results
+    #  prepares the wall columns to be rendered, in screen order, based on the ray casting results
     def get_objects_to_render(self):
-        self.objects_to_render = []
+        self.walls_to_render = []
+        get_column = self.game.object_renderer.wall_columns.get_column
         for ray, values in enumerate(self.ray_casting_result):
             depth, proj_height, texture, offset = values
 
-            if proj_height < HEIGHT:
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), 0, SCALE, TEXTURE_SIZE
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, proj_height))
-                wall_pos = (ray * SCALE, HALF_HEIGHT - proj_height // 2)
+            wall_column, height = get_column(texture, offset, proj_height)
+            if height < HEIGHT:
+                wall_pos = (ray * SCALE, HALF_HEIGHT - height // 2)
             else:
-                texture_height = TEXTURE_SIZE * HEIGHT / proj_height
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), HALF_TEXTURE_SIZE - texture_height // 2,
-                    SCALE, texture_height
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, HEIGHT))
                 wall_pos = (ray * SCALE, 0)
 
-            self.objects_to_render.append((depth, wall_column, wall_pos))
+            self.walls_to_render.append((wall_column, wall_pos))
 
 
-    # performs the actual ray casting by calculating intersections with walls and determining textures and depths.
+    # Casts all rays with the selected backend and keeps the wall depth of every ray.
     def ray_cast(self):
+        self.backends[self.backend]()
+        self.depth_buffer = [values[0] for values in self.ray_casting_result]
+
+    # performs the actual ray casting by calculating intersections with walls and determining textures and depths.
+    def ray_cast_python(self):
         self.ray_casting_result = []
         texture_vert, texture_hor = 1, 1
         ox, oy = self.game.player.pos
         x_map, y_map = self.game.player.map_pos
+        tiles, cols, rows = self.game.map.tiles, self.game.map.cols, self.game.map.rows
 
         ray_angle = self.game.player.angle - HALF_FOV + 0.0001
         for ray in range(NUM_RAYS):
@@ -58,9 +72,9 @@ class RayCasting:
             dx = delta_depth * cos_a
 
             for i in range(MAX_DEPTH):
-                tile_hor = int(x_hor), int(y_hor)
-                if tile_hor in self.game.map.world_map:
-                    texture_hor = self.game.map.world_map[tile_hor]
+                tx, ty = int(x_hor), int(y_hor)
+                if 0 <= tx < cols and 0 <= ty < rows and tiles[ty * cols + tx]:  # inlined Map.get_tile
+                    texture_hor = tiles[ty * cols + tx]
                     break
                 x_hor += dx
                 y_hor += dy
@@ -76,9 +90,9 @@ class RayCasting:
             dy = delta_depth * sin_a
 
             for i in range(MAX_DEPTH):
-                tile_vert = int(x_vert), int(y_vert)
-                if tile_vert in self.game.map.world_map:
-                    texture_vert = self.game.map.world_map[tile_vert]
+                tx, ty = int(x_vert), int(y_vert)
+                if 0 <= tx < cols and 0 <= ty < rows and tiles[ty * cols + tx]:  # inlined Map.get_tile
+                    texture_vert = tiles[ty * cols + tx]
                     break
                 x_vert += dx
                 y_vert += dy
@@ -105,6 +119,130 @@ class RayCasting:
 
             ray_angle += DELTA_ANGLE
 
+    # Same algorithm as ray_cast_python, but every ray is stepped at once over the wall grid.
+    # Positions are accumulated with cumsum so they round exactly like the per-ray loop.
+    def ray_cast_numpy(self):
+        ox, oy = self.game.player.pos
+        x_map, y_map = self.game.player.map_pos
+        rays = np.arange(NUM_RAYS)
+
+        ray_angle = np.full(NUM_RAYS, DELTA_ANGLE)
+        ray_angle[0] = self.game.player.angle - HALF_FOV + 0.0001
+        ray_angle = np.cumsum(ray_angle)
+        sin_a = np.sin(ray_angle)
+        cos_a = np.cos(ray_angle)
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # horizontals
+            y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+            dy = np.where(sin_a > 0, 1.0, -1.0)
+            depth_hor = (y_hor - oy) / sin_a
+            x_hor = ox + depth_hor * cos_a
+            delta_depth = dy / sin_a
+            dx = delta_depth * cos_a
+            x_hor, y_hor, depth_hor = self.march(x_hor, dx), self.march(y_hor, dy), self.march(depth_hor, delta_depth)
+            step_hor, texture_hor = self.first_hit(x_hor, y_hor)
+            x_hor, depth_hor = x_hor[rays, step_hor], depth_hor[rays, step_hor]
+
+            # verticals
+            x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+            dx = np.where(cos_a > 0, 1.0, -1.0)
+            depth_vert = (x_vert - ox) / cos_a
+            y_vert = oy + depth_vert * sin_a
+            delta_depth = dx / cos_a
+            dy = delta_depth * sin_a
+            x_vert, y_vert, depth_vert = self.march(x_vert, dx), self.march(y_vert, dy), self.march(depth_vert, delta_depth)
+            step_vert, texture_vert = self.first_hit(x_vert, y_vert)
+            y_vert, depth_vert = y_vert[rays, step_vert], depth_vert[rays, step_vert]
+
+        # depth, texture offset
+        vert = depth_vert < depth_hor
+        depth = np.where(vert, depth_vert, depth_hor)
+        texture = np.where(vert, texture_vert, texture_hor)
+        offset = np.where(vert,
+                          np.where(cos_a > 0, y_vert % 1, 1 - y_vert % 1),
+                          np.where(sin_a > 0, 1 - x_hor % 1, x_hor % 1))
+
+        # remove fishbowl effect
+        depth *= np.cos(self.game.player.angle - ray_angle)
+
+        # projection
+        proj_height = SCREEN_DIST / (depth + 0.0001)
+
+        self.ray_casting_result = list(zip(depth.tolist(), proj_height.tolist(), texture.tolist(), offset.tolist()))
+
+    # Returns the MAX_DEPTH + 1 positions a ray passes through, starting at start and adding step each time.
+    @staticmethod
+    def march(start, step):
+        values = np.empty((NUM_RAYS, MAX_DEPTH + 1))
+        values[:, 0] = start
+        values[:, 1:] = step[:, None]
+        return np.cumsum(values, axis=1)
+
+    # Finds the first step at which each ray enters a wall tile and the texture of that wall.
+    # Rays that hit nothing stop after MAX_DEPTH steps and keep the texture of the previous ray,
+    # like the texture variables carried across iterations of the per-ray loop.
+    def first_hit(self, xs, ys):
+        cols, rows = self.wall_grid.shape
+        tile_x = xs[:, :MAX_DEPTH].astype(np.intp)
+        tile_y = ys[:, :MAX_DEPTH].astype(np.intp)
+        inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+        values = np.zeros(tile_x.shape, dtype=np.uint8)
+        values[inside] = self.wall_grid[tile_x[inside], tile_y[inside]]
+        hit = values > 0
+
+        found = hit.any(axis=1)
+        step = np.where(found, hit.argmax(axis=1), MAX_DEPTH)
+        textures = values[np.arange(NUM_RAYS), np.minimum(step, MAX_DEPTH - 1)]
+        last_hit = np.maximum.accumulate(np.where(found, np.arange(NUM_RAYS), -1))
+        texture = np.where(last_hit >= 0, textures[last_hit], 1)
+        return step, texture
+
     def update(self):
-        self.ray_cast()
-        self.get_objects_to_render()
\ No newline at end of file
+        with self.game.profiler.span('RayCasting.ray_cast'):
+            self.ray_cast()
+        self.sprites_to_render = []
+        if self.game.object_renderer.wall_renderer is None:
+            with self.game.profiler.span('RayCasting.get_objects_to_render'):
+                self.get_objects_to_render()
+
+
+# Casts both backends from the centre of every free tile of a map at several angles and
+# returns the largest depth, projected height and offset differences and the number of
+# rays whose texture differs. Run this module directly to check both maps.
+def check_backend_parity(map_num, angle_steps=4):
+    from map import Map
+    game = SimpleNamespace(object_renderer=SimpleNamespace(wall_textures={}))
+    game.map = Map(game, map_num)
+    game.player = SimpleNamespace()
+    ray_casting = RayCasting(game)
+
+    max_depth = max_height = max_offset = 0
+    texture_mismatches = 0
+    for y, row in enumerate(game.map.mini_map):
+        for x, value in enumerate(row):
+            if value:
+                continue
+            for i in range(angle_steps):
+                game.player.pos = x + 0.5, y + 0.5
+                game.player.map_pos = x, y
+                game.player.angle = math.tau * i / angle_steps
+                ray_casting.ray_cast_python()
+                expected = ray_casting.ray_casting_result
+                ray_casting.ray_cast_numpy()
+                for (depth_a, height_a, texture_a, offset_a), (depth_b, height_b, texture_b, offset_b) in \
+                        zip(expected, ray_casting.ray_casting_result):
+                    if texture_a != texture_b:
+                        texture_mismatches += 1
+                        continue
+                    max_depth = max(max_depth, abs(depth_a - depth_b))
+                    max_height = max(max_height, abs(height_a - height_b) / height_a)
+                    max_offset = max(max_offset, abs(offset_a - offset_b))
+    return max_depth, max_height, max_offset, texture_mismatches
+
+
+if __name__ == '__main__':
+    for map_num in (1, 2):
+        depth, height, offset, mismatches = check_backend_parity(map_num)
+        print(f'map {map_num}: max depth diff {depth:.2e}, max relative height diff {height:.2e}, '
+              f'max offset diff {offset:.2e}, texture mismatches {mismatches}')
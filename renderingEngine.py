@@ -1,21 +1,42 @@
 import pygame as pg
 from settings import *
+from surfaceCache import WallColumnCache, SpriteScaleCache
+from wallRenderer import FramebufferWallRenderer, np
+
+WALL_TEXTURE_PATHS = {
+    1: 'resources/textures/1.jpg',
+    2: 'resources/textures/2.png',
+    3: 'resources/textures/3.png',
+    4: 'resources/textures/4.png',
+    5: 'resources/textures/5.png',
+}
+DIGIT_SIZE = 90
+# full screen and HUD images, as (path, size)
+SKY_TEXTURE = 'resources/textures/sky.png', (WIDTH, HALF_HEIGHT)
+BLOOD_SCREEN_TEXTURE = 'resources/textures/blood_screen.png', RES
+GAME_OVER_TEXTURE = 'resources/textures/game_over.png', RES
+WIN_TEXTURE = 'resources/textures/win.png', RES
+DIGIT_TEXTURES = [(f'resources/textures/digits/{i}.png', (DIGIT_SIZE, DIGIT_SIZE)) for i in range(11)]
 
 # rendering the game objects on the screen and managing the display of various elements such as backgrounds, player health, win/loss screens, and textures.
 class RenderingEngine:
     def __init__(self, game):
         self.game = game
         self.screen = game.screen
+        self.assets = []
         self.wall_textures = self.load_wall_textures()
-        self.sky_image = self.get_texture('resources/textures/sky.png', (WIDTH, HALF_HEIGHT))
+        self.sprite_cache = SpriteScaleCache()
+        self.wall_renderer = None
+        if WALL_RENDERER == 'framebuffer' and np is not None:
+            self.wall_renderer = FramebufferWallRenderer(game, self.wall_textures)
+        self.sky_image = self.get_texture(*SKY_TEXTURE)
         self.sky_offset = 0
-        self.blood_screen = self.get_texture('resources/textures/blood_screen.png', RES)
-        self.digit_size = 90
-        self.digit_images = [self.get_texture(f'resources/textures/digits/{i}.png', [self.digit_size] * 2)
-                             for i in range(11)]
+        self.blood_screen = self.get_texture(*BLOOD_SCREEN_TEXTURE)
+        self.digit_size = DIGIT_SIZE
+        self.digit_images = [self.get_texture(*digit) for digit in DIGIT_TEXTURES]
         self.digits = dict(zip(map(str, range(11)), self.digit_images))
-        self.game_over_image = self.get_texture('resources/textures/game_over.png', RES)
-        self.win_image = self.get_texture('resources/textures/win.png', RES)
+        self.game_over_image = self.get_texture(*GAME_OVER_TEXTURE)
+        self.win_image = self.get_texture(*WIN_TEXTURE)
 
     # Draws the game objects on the screen
     def draw(self):
@@ -44,29 +65,61 @@ class RenderingEngine:
 
     # Draws the sky background and the floor on the screen.
     def draw_background(self):
-        self.sky_offset = (self.sky_offset + 4.5 * self.game.player.rel) % WIDTH
+        # follows the view angle (four sky widths per turn), so it moves with the rendered pose
+        self.sky_offset = (self.game.player.angle * 4 * WIDTH / math.tau) % WIDTH
         self.screen.blit(self.sky_image, (-self.sky_offset, 0))
         self.screen.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
         # floor
         pg.draw.rect(self.screen, FLOOR_COLOR, (0, HALF_HEIGHT, WIDTH, HEIGHT))
 
-    # Renders the game objects on the screen based on their depth.
+    # Renders the game objects on the screen. Walls are drawn in screen order, then the sprites
+    # are sorted by depth and drawn back to front, each only on the rays where it is in front of the wall.
     def render_game_objects(self):
-        list_objects = sorted(self.game.raycasting.objects_to_render, key=lambda t: t[0], reverse=True)
-        for depth, image, pos in list_objects:
-            self.screen.blit(image, pos)
+        raycasting = self.game.raycasting
+        if self.wall_renderer is None:
+            self.screen.blits(raycasting.walls_to_render, doreturn=False)
+        else:
+            self.wall_renderer.draw(raycasting.ray_casting_result)
+
+        sprites = sorted(raycasting.sprites_to_render, key=lambda t: t[0], reverse=True)
+        for depth, image, pos in sprites:
+            self.draw_clipped(depth, image, pos, raycasting.depth_buffer)
+
+    # Draws a sprite in runs of consecutive rays where it is closer than the depth buffer.
+    def draw_clipped(self, depth, image, pos, depth_buffer):
+        x, y = pos
+        first_ray = max(int(x // SCALE), 0)
+        last_ray = min(int(-(-(x + image.get_width()) // SCALE)), NUM_RAYS)
+        run_start = None
+        for ray in range(first_ray, last_ray + 1):
+            if ray < last_ray and depth < depth_buffer[ray]:
+                if run_start is None:
+                    run_start = ray
+            elif run_start is not None:
+                left = run_start * SCALE
+                area = pg.Rect(left - x, 0, (ray - run_start) * SCALE, image.get_height())
+                self.screen.blit(image, (left, y), area)
+                run_start = None
 
+    def get_texture(self, path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
+        texture = self.game.assets.acquire(path, 'texture', res)
+        self.assets.append(texture)
+        return texture
+
+    # Starts decoding and scaling the wall, sky and HUD textures in the background, before a level is built.
     @staticmethod
-    def get_texture(path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
-        texture = pg.image.load(path).convert_alpha()
-        return pg.transform.scale(texture, res)
+    def preload(assets):
+        assets.preload((path, (TEXTURE_SIZE, TEXTURE_SIZE), False) for path in WALL_TEXTURE_PATHS.values())
+        screen_textures = [SKY_TEXTURE, BLOOD_SCREEN_TEXTURE, GAME_OVER_TEXTURE, WIN_TEXTURE] + DIGIT_TEXTURES
+        assets.preload((path, size, False) for path, size in screen_textures)
+
+    # Gives the textures back to the asset registry, when the level is replaced.
+    def release(self):
+        self.game.assets.release_all(self.assets)
+        self.assets = []
 
-    # Loads wall textures
+    # Loads wall textures and pre-slices them into the wall column cache
     def load_wall_textures(self):
-        return {
-            1: self.get_texture('resources/textures/1.jpg'),
-            2: self.get_texture('resources/textures/2.png'),
-            3: self.get_texture('resources/textures/3.png'),
-            4: self.get_texture('resources/textures/4.png'),
-            5: self.get_texture('resources/textures/5.png'),
-        }
\ No newline at end of file
+        textures = {texture: self.get_texture(path) for texture, path in WALL_TEXTURE_PATHS.items()}
+        self.wall_columns = WallColumnCache(textures)
+        return textures
\ No newline at end of file
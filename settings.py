@@ -6,8 +6,15 @@ RES = WIDTH, HEIGHT = 1600, 900
 HALF_WIDTH = WIDTH // 2
 HALF_HEIGHT = HEIGHT // 2
 FPS = 0
+# fixed timestep: the simulation (player, NPCs, weapon) advances in ticks of SIM_TICK_TIME milliseconds whatever
+# the frame rate, at most SIM_MAX_TICKS per frame (the rest of a backlog is dropped); NPC speeds are in tiles per tick
+SIM_TICK_RATE = 60
+SIM_TICK_TIME = 1000 / SIM_TICK_RATE
+SIM_MAX_TICKS = 5
+# the global trigger (death animations) fires every GLOBAL_TRIGGER_TIME milliseconds of simulated time
+GLOBAL_TRIGGER_TIME = 40
 
-PLAYER_POS = 1.5, 5  # mini_map
+PLAYER_POS = 1.5, 5  # start of the built-in maps, see mapConverter.py
 PLAYER_ANGLE = 0
 PLAYER_SPEED = 0.004
 PLAYER_ROT_SPEED = 0.002
@@ -32,4 +39,110 @@ SCREEN_DIST = HALF_WIDTH / math.tan(HALF_FOV)
 SCALE = WIDTH // NUM_RAYS
 
 TEXTURE_SIZE = 256
-HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
\ No newline at end of file
+HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
+
+# map files, see mapFile.py
+MAP_DIR = 'resources/maps'
+# procedural maps, chosen with a map number like 'rooms:256x256:7' (see mapGenerator.py): the default
+# wall density of each kind, the weights of the wall textures, the room cell size in tiles and the
+# share of free tiles with a light
+MAP_GENERATOR_DENSITY = {'rooms': 0.5, 'arena': 0.3, 'maze': 1.0}
+MAP_GENERATOR_TEXTURES = {1: 4, 2: 1, 3: 3, 4: 2, 5: 1}
+MAP_GENERATOR_ROOM_SIZE = 12
+MAP_GENERATOR_LIGHTS = 0.01
+
+# ray casting backend: 'numpy' steps every ray at once, 'python' casts ray by ray
+RAYCAST_BACKEND = 'numpy'
+
+# wall column cache: max scaled columns kept and the step projected heights are rounded to
+WALL_CACHE_SIZE = 4096
+WALL_HEIGHT_STEP = 2
+
+# wall renderer: 'columns' blits one cached surface per ray, 'framebuffer' writes all walls
+# into one pixel array with pygame.surfarray (needs numpy)
+WALL_RENDERER = 'columns'
+
+# scaled sprite cache: max entries, max pixel memory in bytes and the step projected sizes are rounded to
+SPRITE_CACHE_SIZE = 512
+SPRITE_CACHE_BYTES = 64 * 1024 * 1024
+SPRITE_SIZE_STEP = 4
+
+# profiler: F3 toggles the overlay (and profiling), F4 writes a Chrome trace of the ring buffer
+PROFILER_ENABLED = False
+PROFILER_CAPACITY = 65536
+PROFILER_FRAMES = 240
+PROFILER_TRACE_PATH = 'profile_trace.json'
+
+# pre-baked asset pack, built with "python assetPack.py build"; loose files are used when it is missing or stale
+ASSET_PACK_PATH = 'resources/assets.pack'
+
+# worker threads decoding images in the background while the menus are shown
+ASSET_PRELOAD_WORKERS = 4
+
+# pathfinding: 'bfs' searches from every NPC to the player, 'flowfield' shares one search from the player,
+# 'astar' runs an A* search per NPC on an array grid, 'hpa' searches a graph of map clusters (for large maps)
+PATHFINDING_MODE = 'flowfield'
+FLOW_OCCUPIED_COST = 2
+# whether A* may move diagonally past the corner of a wall
+PATHFINDING_CORNER_CUTTING = True
+# hierarchical pathfinding: cluster width and height in tiles, and the free border run length
+# from which a border gets an entrance at each end instead of one in the middle
+PATHFINDING_CLUSTER_SIZE = 8
+PATHFINDING_ENTRANCE_SPLIT = 6
+# number of tile changes the map remembers, so pathfinding can update only what changed
+MAP_CHANGE_HISTORY = 256
+# cached pathfinding results, by (NPC tile, player tile); 'flowfield' mode reads its shared field directly instead
+PATH_CACHE_SIZE = 1024
+
+# AI scheduler: NPCs think (line of sight raycast and path lookup) every interval milliseconds by state,
+# scaled up by distance / AI_NEAR_DISTANCE beyond it, within a budget of AI_FRAME_BUDGET ms per rendered frame
+# shared by all the simulation ticks of that frame
+AI_SCHEDULER = True
+AI_THINK_INTERVALS = {'attacking': 60, 'chasing': 60, 'searching': 150, 'idle': 400, 'dead': 0}
+AI_NEAR_DISTANCE = 6
+AI_MAX_THINK_INTERVAL = 1500
+AI_FRAME_BUDGET = 2.0
+
+# potentially visible set: rays cast from each sample point (offsets inside a tile) when a map is built,
+# and the directory the tables are cached in
+PVS_RAYS = 480
+PVS_SAMPLE_OFFSETS = (0.02, 0.98)
+PVS_CACHE_DIR = 'resources/pvs'
+# the table has a bit per pair of tiles, so it is not built for maps with more tiles than this
+PVS_MAX_TILES = 4096
+
+# NPC storage: 'objects' keeps one NPC object per NPC, 'arrays' keeps NPC state in NumPy arrays and
+# updates all NPCs with batched array operations (for large NPC counts)
+NPC_BACKEND = 'objects'
+# NPC simulation in a worker process (with the 'arrays' backend): NPCs think and move every
+# NPC_WORKER_STEP milliseconds in another process, which shares its snapshots of them through
+# shared memory sized for NPC_WORKER_CAPACITY NPCs
+NPC_WORKER = False
+NPC_WORKER_STEP = 16
+NPC_WORKER_CAPACITY = 4096
+
+# spatial index of the NPCs: bucket width and height in tiles, and how far from the line of fire
+# (in tiles) an NPC is still checked for a hit, which covers the widest sprite
+SPATIAL_CELL_SIZE = 2
+SHOT_RADIUS = 1.5
+
+# spawning (see spawnSystem.py): NPCs created per simulation tick at most, the minimum distance in tiles from a
+# new NPC to any other NPC and to the player, and how many spawn tiles are tried per NPC before it waits for the next tick
+SPAWN_PER_TICK = 32
+SPAWN_MIN_SPACING = 1
+SPAWN_PLAYER_DISTANCE = 6
+SPAWN_TRIES = 8
+# timed waves after the difficulty's enemies: how many, NPCs per wave and milliseconds between waves
+SPAWN_WAVES = 0
+SPAWN_WAVE_SIZE = 10
+SPAWN_WAVE_INTERVAL = 30000
+
+# world chunks (see worldChunks.py): chunk width and height in tiles; NPCs within CHUNK_ACTIVE_RADIUS chunks
+# of the player's chunk are simulated every frame, those within CHUNK_RESIDENT_RADIUS (where the path graph
+# and sprites are loaded) once every CHUNK_COARSE_INTERVAL milliseconds, and the rest are frozen.
+# The active radius should cover MAX_DEPTH, the farthest NPCs can see. Off, the whole map is always loaded.
+CHUNK_STREAMING = True
+CHUNK_SIZE = 16
+CHUNK_ACTIVE_RADIUS = 2
+CHUNK_RESIDENT_RADIUS = 3
+CHUNK_COARSE_INTERVAL = 250
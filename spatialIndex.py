@@ -0,0 +1,113 @@
+import math
+from settings import *
+
+
+# A uniform grid of buckets holding entities (NPCs) by the tile they stand on. Entities are moved
+# between buckets only when they change tile, and the tiles held by living entities are kept in
+# the occupied set, which is updated in place instead of being rebuilt every frame; version is
+# bumped whenever that set changes. Besides occupancy it answers radius queries and queries
+# along a ray (e.g. a shot), looking only at the buckets those touch.
+class SpatialGrid:
+    def __init__(self, cols, rows, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cols = -(-cols // cell_size)
+        self.rows = -(-rows // cell_size)
+        self.buckets = [[] for _ in range(self.cols * self.rows)]
+        self.tiles = {}  # entity -> tile it is filed under
+        self.tile_counts = {}  # tile -> living entities on it
+        self.occupied = set()  # tiles with at least one living entity
+        self.alive = 0
+        self.version = 0
+
+    def get_bucket(self, tile):
+        return self.buckets[(tile[1] // self.cell_size) * self.cols + tile[0] // self.cell_size]
+
+    def add(self, entity):
+        tile = entity.map_pos
+        self.tiles[entity] = tile
+        self.get_bucket(tile).append(entity)
+        if entity.isAlive:
+            self.alive += 1
+            self.occupy(tile)
+
+    # Files an entity under its current tile; does nothing while it stays on the same tile.
+    def move(self, entity):
+        tile = entity.map_pos
+        old_tile = self.tiles[entity]
+        if tile == old_tile:
+            return
+        self.tiles[entity] = tile
+        old_bucket, bucket = self.get_bucket(old_tile), self.get_bucket(tile)
+        if bucket is not old_bucket:
+            old_bucket.remove(entity)
+            bucket.append(entity)
+        if entity.isAlive:
+            self.vacate(old_tile)
+            self.occupy(tile)
+
+    # Stops counting a dead entity as occupying its tile; it stays in its bucket.
+    def kill(self, entity):
+        self.alive -= 1
+        self.vacate(self.tiles[entity])
+
+    def occupy(self, tile):
+        count = self.tile_counts.get(tile, 0)
+        self.tile_counts[tile] = count + 1
+        if not count:
+            self.occupied.add(tile)
+            self.version += 1
+
+    def vacate(self, tile):
+        count = self.tile_counts[tile] - 1
+        if count:
+            self.tile_counts[tile] = count
+        else:
+            del self.tile_counts[tile]
+            self.occupied.discard(tile)
+            self.version += 1
+
+    # Returns the entities standing on a tile.
+    def query_tile(self, tile, alive=True):
+        return [entity for entity in self.get_bucket(tile)
+                if self.tiles[entity] == tile and (entity.isAlive or not alive)]
+
+    # Returns the entities whose position lies within radius of pos.
+    def query_radius(self, pos, radius, alive=True):
+        x, y = pos
+        found = []
+        for bucket in self.get_buckets(x - radius, y - radius, x + radius, y + radius):
+            for entity in bucket:
+                if (entity.isAlive or not alive) and (entity.x - x) ** 2 + (entity.y - y) ** 2 <= radius * radius:
+                    found.append(entity)
+        return found
+
+    # Returns the entities within radius of the ray from pos along angle, in front of pos and no
+    # further than length, visiting only the buckets along the ray.
+    def query_ray(self, pos, angle, length, radius, alive=True):
+        x, y = pos
+        cos_a, sin_a = math.cos(angle), math.sin(angle)
+        seen = set()
+        found = []
+        step = self.cell_size
+        for i in range(int(length / step) + 1):
+            px, py = x + cos_a * i * step, y + sin_a * i * step
+            reach = radius + step
+            for bucket in self.get_buckets(px - reach, py - reach, px + reach, py + reach):
+                if id(bucket) in seen:
+                    continue
+                seen.add(id(bucket))
+                for entity in bucket:
+                    if not entity.isAlive and alive:
+                        continue
+                    dx, dy = entity.x - x, entity.y - y
+                    along = dx * cos_a + dy * sin_a
+                    if 0 <= along <= length and abs(dy * cos_a - dx * sin_a) <= radius:
+                        found.append(entity)
+        return found
+
+    # Yields the buckets overlapping a rectangle in tile coordinates.
+    def get_buckets(self, left, top, right, bottom):
+        size = self.cell_size
+        for row in range(max(0, int(top) // size), min(self.rows - 1, int(bottom) // size) + 1):
+            for col in range(max(0, int(left) // size), min(self.cols - 1, int(right) // size) + 1):
+                yield self.buckets[row * self.cols + col]
@@ -0,0 +1,91 @@
+from collections import deque
+from random import choices, randrange
+from settings import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Places NPCs on the map. The tiles NPCs may spawn on (free tiles allowed by the map's spawn zones)
+# are indexed once per map as a flat array, so a spawn position is sampled in constant time: a
+# random entry is taken and rejected only when a wall was built on it since, when it is too close
+# to the player or when another NPC stands within SPAWN_MIN_SPACING of it (looked up in the
+# spatial index), for up to SPAWN_TRIES entries. NPCs waiting to be placed are queued and at most
+# SPAWN_PER_TICK of them are created each tick, so spawning thousands of NPCs costs a fixed
+# amount per tick instead of stalling the level start. After the first wave, SPAWN_WAVES more
+# waves of SPAWN_WAVE_SIZE NPCs are queued every SPAWN_WAVE_INTERVAL milliseconds.
+class SpawnSystem:
+    def __init__(self, game, entity_manager):
+        self.game = game
+        self.entity_manager = entity_manager
+        self.tiles = self.get_spawn_tiles()  # tile indices y * cols + x
+        self.pending = deque()  # NPC types waiting to be spawned
+        self.waves_left = SPAWN_WAVES
+        self.time = 0
+        self.next_wave = SPAWN_WAVE_INTERVAL
+        self.spawned = 0
+        self.failed = 0  # spawns put off to the next tick because no free spot was found
+
+    def get_spawn_tiles(self):
+        game_map = self.game.map
+        if np is not None:
+            return np.flatnonzero(game_map.get_spawn_mask())
+        return [y * game_map.cols + x for y in range(game_map.rows) for x in range(game_map.cols)
+                if game_map.is_spawn_tile((x, y))]
+
+    # Draws count NPC types by the entity manager's spawn weights.
+    def draw_types(self, count):
+        return choices(self.entity_manager.npc_types, self.entity_manager.weights, k=count)
+
+    def queue(self, npc_types):
+        self.pending.extend(npc_types)
+
+    # True once every wave has been queued and spawned.
+    @property
+    def done(self):
+        return not self.pending and not self.waves_left
+
+    # Queues the next wave when it is due and spawns the queued NPCs within the per-tick limit.
+    def update(self):
+        self.time += self.game.delta_time
+        if self.waves_left and self.time >= self.next_wave:
+            self.queue(self.draw_types(SPAWN_WAVE_SIZE))
+            self.waves_left -= 1
+            self.next_wave += SPAWN_WAVE_INTERVAL
+        self.spawn(SPAWN_PER_TICK)
+
+    # Creates up to limit queued NPCs; the ones without a free spot wait for the next tick.
+    def spawn(self, limit):
+        for _ in range(min(limit, len(self.pending))):
+            pos = self.sample()
+            if pos is None:
+                self.failed += 1
+                break
+            npc_type = self.pending.popleft()
+            self.entity_manager.add_npc(npc_type(self.game, pos=pos))
+            self.spawned += 1
+
+    # Returns the center of a random spawn tile away from the player and other NPCs, or None.
+    def sample(self):
+        if not len(self.tiles):
+            return None
+        game_map = self.game.map
+        player_x, player_y = self.game.player.pos
+        query_radius = self.entity_manager.spatial_index.query_radius
+        for _ in range(SPAWN_TRIES):
+            y, x = divmod(int(self.tiles[randrange(len(self.tiles))]), game_map.cols)
+            pos = x + 0.5, y + 0.5
+            if game_map.is_wall(x, y):
+                continue
+            if (pos[0] - player_x) ** 2 + (pos[1] - player_y) ** 2 < SPAWN_PLAYER_DISTANCE ** 2:
+                continue
+            if SPAWN_MIN_SPACING and query_radius(pos, SPAWN_MIN_SPACING):
+                continue
+            return pos
+        return None
+
+    def stats(self):
+        return {'spawned': self.spawned, 'pending': len(self.pending), 'waves_left': self.waves_left,
+                'failed': self.failed}
@@ -1,16 +1,19 @@
 import pygame as pg
 from settings import *
-import os
 from collections import deque
 
 
 class SpriteObject:
+    asset_category = 'sprite'
+
     def __init__(self, game, path='resources/sprites/static_sprites/candlebra.png',
                  pos=(10.5, 3.5), scale=0.7, shift=0.27):
         self.game = game
         self.player = game.player
         self.x, self.y = pos
-        self.image = pg.image.load(path).convert_alpha()
+        self.assets = []
+        self.image = game.assets.acquire(path, self.asset_category)
+        self.assets.append(self.image)
         self.IMAGE_WIDTH = self.image.get_width()
         self.IMAGE_HALF_WIDTH = self.image.get_width() // 2
         self.IMAGE_RATIO = self.IMAGE_WIDTH / self.image.get_height()
@@ -21,20 +24,26 @@ class SpriteObject:
 
     def get_sprite_projection(self):
         proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
-        proj_width, proj_height = proj * self.IMAGE_RATIO, proj
-
-        image = pg.transform.scale(self.image, (proj_width, proj_height))
+        image = self.game.object_renderer.sprite_cache.get_scaled(self.image, proj, self.IMAGE_RATIO)
+        proj_width, proj_height = image.get_size()
 
         self.sprite_half_width = proj_width // 2
         height_shift = proj_height * self.SPRITE_HEIGHT_SHIFT
         pos = self.screen_x - self.sprite_half_width, HALF_HEIGHT - proj_height // 2 + height_shift
 
-        self.game.raycasting.objects_to_render.append((self.norm_dist, image, pos))
+        self.game.raycasting.sprites_to_render.append((self.norm_dist, image, pos))
 
-    def getSprite(self):
+    # Computes the distance and screen position of the sprite, and the half width it is drawn with,
+    # without scaling its image. Returns whether the sprite is to be drawn.
+    def locate(self):
         dx = self.x - self.player.x
         dy = self.y - self.player.y
         self.dx, self.dy = dx, dy
+        self.dist = math.hypot(dx, dy)
+        # sprites on tiles the player's tile cannot see are not projected
+        if not self.game.visibility.can_see(self.player.map_pos, (int(self.x), int(self.y))):
+            self.sprite_half_width = 0
+            return False
         self.theta = math.atan2(dy, dx)
 
         delta = self.theta - self.player.angle
@@ -44,14 +53,26 @@ class SpriteObject:
         delta_rays = delta / DELTA_ANGLE
         self.screen_x = (HALF_NUM_RAYS + delta_rays) * SCALE
 
-        self.dist = math.hypot(dx, dy)
         self.norm_dist = self.dist * math.cos(delta)
         if -self.IMAGE_HALF_WIDTH < self.screen_x < (WIDTH + self.IMAGE_HALF_WIDTH) and self.norm_dist > 0.5:
+            proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
+            width, _ = self.game.object_renderer.sprite_cache.get_scaled_size(proj, self.IMAGE_RATIO)
+            self.sprite_half_width = width // 2
+            return True
+        return False
+
+    def getSprite(self):
+        if self.locate():
             self.get_sprite_projection()
 
     def update(self):
         self.getSprite()
 
+    # Gives the shared images this sprite acquired back to the asset registry.
+    def release(self):
+        self.game.assets.release_all(self.assets)
+        self.assets = []
+
 
 class spriteAnimator(SpriteObject):
     def __init__(self, game, path='resources/sprites/animated_sprites/green_light/0.png',
@@ -80,10 +101,9 @@ class spriteAnimator(SpriteObject):
             self.animation_time_prev = time_now
             self.animation_trigger = True
 
+    # Returns a deque of the shared frames in a directory; the deque itself is per sprite
+    # because animating rotates it.
     def get_images(self, path):
-        images = deque()
-        for file_name in os.listdir(path):
-            if os.path.isfile(os.path.join(path, file_name)):
-                img = pg.image.load(path + '/' + file_name).convert_alpha()
-                images.append(img)
-        return images
+        images = self.game.assets.acquire_frames(path, self.asset_category)
+        self.assets.extend(images)
+        return deque(images)
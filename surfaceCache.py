@@ -0,0 +1,96 @@
+import pygame as pg
+from settings import *
+from lruCache import LRUCache
+
+
+# A bounded least-recently-used store of scaled surfaces (see LRUCache). The cache is bounded by
+# entry count and, optionally, by the pixel memory of its surfaces.
+class SurfaceCache(LRUCache):
+    def __init__(self, max_size, max_bytes=None):
+        super().__init__(max_size)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+    def store(self, key, surface):
+        self.bytes += self.surface_bytes(surface)
+        return super().store(key, surface)
+
+    def over_limit(self):
+        return super().over_limit() or (self.max_bytes is not None and self.bytes > self.max_bytes)
+
+    def evict(self):
+        surface = super().evict()
+        self.bytes -= self.surface_bytes(surface)
+        return surface
+
+    def clear(self):
+        super().clear()
+        self.bytes = 0
+
+    @staticmethod
+    def surface_bytes(surface):
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+    def stats(self):
+        return {**super().stats(), 'bytes': self.bytes}
+
+
+# Caches scaled wall columns. Every texture is pre-sliced into TEXTURE_SIZE / SCALE strips once,
+# and scaled strips are kept per (texture, column index, quantized projected height).
+class WallColumnCache(SurfaceCache):
+    def __init__(self, textures, max_size=WALL_CACHE_SIZE, height_step=WALL_HEIGHT_STEP):
+        super().__init__(max_size)
+        self.height_step = height_step
+        self.num_columns = TEXTURE_SIZE // SCALE
+        self.columns = {
+            texture: [image.subsurface(i * SCALE, 0, SCALE, TEXTURE_SIZE) for i in range(self.num_columns)]
+            for texture, image in textures.items()
+        }
+
+    # Rounds a projected height to the cache step.
+    def quantize(self, proj_height):
+        return max(self.height_step, round(proj_height / self.height_step) * self.height_step)
+
+    # Maps a texture offset in [0, 1] to a pre-sliced column index.
+    def column_index(self, offset):
+        return min(int(offset * (TEXTURE_SIZE - SCALE)) // SCALE, self.num_columns - 1)
+
+    # Returns the scaled wall column for a ray and the quantized height it was scaled to.
+    # Columns taller than the screen are cropped to their visible middle part, as before.
+    def get_column(self, texture, offset, proj_height):
+        column = self.column_index(offset)
+        height = self.quantize(proj_height)
+        key = texture, column, height
+        wall_column = self.lookup(key)
+        if wall_column is None:
+            strip = self.columns[texture][column]
+            if height < HEIGHT:
+                wall_column = pg.transform.scale(strip, (SCALE, height))
+            else:
+                texture_height = TEXTURE_SIZE * HEIGHT / height
+                strip = strip.subsurface(0, HALF_TEXTURE_SIZE - texture_height // 2, SCALE, texture_height)
+                wall_column = pg.transform.scale(strip, (SCALE, HEIGHT))
+            self.store(key, wall_column)
+        return wall_column, height
+
+
+# Caches sprite animation frames scaled to their projected size. The projected height is rounded
+# to SPRITE_SIZE_STEP pixels, so sprites whose distance barely changes reuse the same surface.
+class SpriteScaleCache(SurfaceCache):
+    def __init__(self, max_size=SPRITE_CACHE_SIZE, max_bytes=SPRITE_CACHE_BYTES, size_step=SPRITE_SIZE_STEP):
+        super().__init__(max_size, max_bytes)
+        self.size_step = size_step
+
+    # Returns the image scaled to the quantized projected height, keeping its aspect ratio.
+    def get_scaled(self, image, proj_height, ratio):
+        width, height = self.get_scaled_size(proj_height, ratio)
+        key = image, height
+        scaled = self.lookup(key)
+        if scaled is None:
+            scaled = self.store(key, pg.transform.scale(image, (width, height)))
+        return scaled
+
+    # Returns the size get_scaled gives an image of this aspect ratio, without scaling it.
+    def get_scaled_size(self, proj_height, ratio):
+        height = max(self.size_step, round(proj_height / self.size_step) * self.size_step)
+        return int(height * ratio), height
@@ -0,0 +1,145 @@
+import hashlib
+import math
+import os
+import struct
+from settings import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PVS_MAGIC = b'GPVS'
+PVS_VERSION = 1
+PVS_HEADER = struct.Struct('<4sIII')  # magic, version, cols, rows
+
+
+# Potentially visible set of a map: for every pair of tiles, whether any point of one tile can see
+# the other tile. It is computed when a map is loaded by casting PVS_RAYS rays from a few sample
+# points in every free tile and marking the tiles they pass before a wall, and kept as one bitset
+# row per tile (cached on disk under PVS_CACHE_DIR, keyed by the map's content).
+# can_see answers with a couple of integer operations. Until the table is rebuilt for the current
+# map, e.g. after Map.set_tile, or when numpy is missing or the map has more than PVS_MAX_TILES
+# tiles, every tile counts as visible.
+class VisibilityTable:
+    def __init__(self, game):
+        self.game = game
+        self.cols, self.rows = game.map.cols, game.map.rows
+        self.row_bytes = (self.cols * self.rows + 7) // 8
+        self.map_version = game.map.version
+        self.bits = None
+        if np is not None and self.cols * self.rows <= PVS_MAX_TILES:
+            self.bits = self.load() or self.build()
+
+    # Returns True when something on tile b may be visible from tile a.
+    def can_see(self, a, b):
+        if self.bits is None or self.map_version != self.game.map.version:
+            return True
+        j = b[1] * self.cols + b[0]
+        return self.bits[(a[1] * self.cols + a[0]) * self.row_bytes + (j >> 3)] >> (7 - (j & 7)) & 1
+
+    # Returns a bool array over the tiles (indexed y * cols + x) telling which ones may be visible
+    # from tile a, for batched checks, or None when every tile counts as visible.
+    def visible_from(self, a):
+        if self.bits is None or self.map_version != self.game.map.version:
+            return None
+        start = (a[1] * self.cols + a[0]) * self.row_bytes
+        row = np.frombuffer(self.bits, np.uint8, self.row_bytes, start)
+        return np.unpackbits(row, count=self.cols * self.rows).view(bool)
+
+    # Returns the cache file of the current map, named after a hash of its walls and the PVS settings.
+    def get_path(self):
+        key = hashlib.sha1(repr((self.get_walls().tobytes(), self.cols, PVS_RAYS, PVS_SAMPLE_OFFSETS)).encode())
+        return os.path.join(PVS_CACHE_DIR, key.hexdigest()[:16] + '.pvs')
+
+    # Returns the walls of the map as a rows x cols bool array.
+    def get_walls(self):
+        return self.game.map.grid != 0
+
+    # Reads the table from the disk cache, or returns None when it is missing or unreadable.
+    def load(self):
+        try:
+            with open(self.get_path(), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) != PVS_HEADER.size + self.row_bytes * self.cols * self.rows:
+            return None
+        if PVS_HEADER.unpack_from(data) != (PVS_MAGIC, PVS_VERSION, self.cols, self.rows):
+            return None
+        return data[PVS_HEADER.size:]
+
+    # Computes the table and writes it to the disk cache.
+    def build(self):
+        visible = compute_visibility(self.get_walls())
+        bits = np.packbits(visible, axis=1).tobytes()
+        try:
+            os.makedirs(PVS_CACHE_DIR, exist_ok=True)
+            with open(self.get_path(), 'wb') as file:
+                file.write(PVS_HEADER.pack(PVS_MAGIC, PVS_VERSION, self.cols, self.rows))
+                file.write(bits)
+        except OSError:
+            pass  # the cache is only an optimization
+        return bits
+
+
+# Returns a (rows * cols) x (rows * cols) bool matrix telling which tiles each tile can see.
+# Rays are cast from the sample points of every free tile; a ray passes the tile it starts in and
+# the tile it enters at every grid line it crosses, up to and including the first wall, like the
+# DDA in RayCasting and NPC.ray_cast_player_npc. Seeing is made symmetric at the end.
+def compute_visibility(walls):
+    rows, cols = walls.shape
+    visible = np.zeros((rows * cols, rows * cols), dtype=bool)
+    angles = (np.arange(PVS_RAYS) + 0.5) * math.tau / PVS_RAYS
+    offsets = np.array(PVS_SAMPLE_OFFSETS)
+    offset_x, offset_y = np.meshgrid(offsets, offsets)
+    sin_a = np.tile(np.sin(angles), offset_x.size)
+    cos_a = np.tile(np.cos(angles), offset_x.size)
+    offset_x = np.repeat(offset_x.ravel(), PVS_RAYS)
+    offset_y = np.repeat(offset_y.ravel(), PVS_RAYS)
+
+    # Returns the tiles entered at every crossing of one set of grid lines, their depths and the
+    # depth of the first wall, marching lines steps.
+    def crossings(ox, oy, first, step, sin_a, cos_a, lines):
+        depth = (first - oy) / sin_a
+        delta_depth = step / sin_a
+        steps = np.arange(lines)
+        depths = depth[:, None] + delta_depth[:, None] * steps
+        ys = first[:, None] + step[:, None] * steps
+        xs = ox[:, None] + depths * cos_a[:, None]
+        return np.floor(xs).astype(np.intp), np.floor(ys).astype(np.intp), depths
+
+    for y in range(rows):
+        for x in range(cols):
+            if walls[y, x]:
+                continue
+            ox, oy = x + offset_x, y + offset_y
+            # horizontal grid lines, then vertical ones with x and y swapped
+            hx, hy, h_depth = crossings(ox, oy, np.where(sin_a > 0, y + 1.0, y - 1e-6),
+                                        np.where(sin_a > 0, 1.0, -1.0), sin_a, cos_a, rows + 1)
+            vy, vx, v_depth = crossings(oy, ox, np.where(cos_a > 0, x + 1.0, x - 1e-6),
+                                        np.where(cos_a > 0, 1.0, -1.0), cos_a, sin_a, cols + 1)
+            tiles = []
+            for tx, ty, depth in ((hx, hy, h_depth), (vx, vy, v_depth)):
+                inside = (tx >= 0) & (tx < cols) & (ty >= 0) & (ty < rows)
+                blocked = ~inside | walls[ty.clip(0, rows - 1), tx.clip(0, cols - 1)]
+                tiles.append((tx, ty, depth, inside, blocked))
+            wall_depth = np.minimum(*[np.where(blocked.any(axis=1), depth[np.arange(len(depth)), blocked.argmax(axis=1)],
+                                               np.inf) for _, _, depth, _, blocked in tiles])
+            row = visible[y * cols + x]
+            row[y * cols + x] = True
+            for tx, ty, depth, inside, _ in tiles:
+                seen = inside & (depth <= wall_depth[:, None])
+                row[ty[seen] * cols + tx[seen]] = True
+    visible |= visible.T
+
+    # sprites are billboards reaching past their tile, so a tile also counts as seen when a
+    # neighbouring tile is; otherwise sprites peeking around a corner would pop in
+    seen = visible.reshape(rows * cols, rows, cols)
+    grown = seen.copy()
+    grown[:, 1:, :] |= seen[:, :-1, :]
+    grown[:, :-1, :] |= seen[:, 1:, :]
+    seen = grown.copy()
+    grown[:, :, 1:] |= seen[:, :, :-1]
+    grown[:, :, :-1] |= seen[:, :, 1:]
+    return grown.reshape(rows * cols, rows * cols)
@@ -0,0 +1,63 @@
+import pygame as pg
+from settings import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# colour of the wall layer pixels that are not covered by a wall
+WALL_LAYER_KEY = (255, 0, 255)
+
+
+# Draws all wall columns in a single pass. The textures are turned into one flat array of pixels
+# in the wall layer's format once; each frame every ray's column is sampled from it straight into
+# the wall layer's pixels, and the layer is blitted to the screen with one call.
+class FramebufferWallRenderer:
+    def __init__(self, game, wall_textures):
+        self.game = game
+        self.screen = game.screen
+        self.layer = pg.Surface(RES).convert()
+        self.layer.set_colorkey(WALL_LAYER_KEY)
+        self.empty_pixel = self.layer.map_rgb(WALL_LAYER_KEY)
+
+        # texture id -> index into the texture array. Every texture column is padded with an
+        # empty pixel at both ends, so rows above and below a wall sample the colour key.
+        self.texture_index = np.zeros(max(wall_textures) + 1, dtype=np.int32)
+        self.column_length = TEXTURE_SIZE + 2
+        textures = np.full((len(wall_textures), TEXTURE_SIZE, self.column_length), self.empty_pixel, dtype=np.uint32)
+        for i, (texture_id, texture) in enumerate(sorted(wall_textures.items())):
+            self.texture_index[texture_id] = i * TEXTURE_SIZE * self.column_length
+            pixels = pg.surfarray.array2d(texture.convert(self.layer))
+            # keep wall pixels from matching the colour key
+            pixels[pixels == self.empty_pixel] = self.layer.map_rgb((254, 0, 254))
+            textures[i, :, 1:-1] = pixels
+        self.texture_pixels = textures.ravel()
+
+        # per frame buffers, laid out as [screen row, ray]
+        self.rows = np.arange(HEIGHT, dtype=np.float32)[:, None]
+        self.texture_y = np.empty((HEIGHT, NUM_RAYS), dtype=np.float32)
+        self.indices = np.empty((HEIGHT, NUM_RAYS), dtype=np.int32)
+        self.columns = np.empty((HEIGHT, NUM_RAYS), dtype=np.uint32)
+
+    # Samples the textured column of every ray into the wall layer and draws it to the screen.
+    def draw(self, ray_casting_result):
+        _, proj_height, texture, offset = np.asarray(ray_casting_result, dtype=np.float32).T
+        column_start = self.texture_index[texture.astype(np.intp)]
+        column_start += (offset * (TEXTURE_SIZE - SCALE)).astype(np.int32) * self.column_length
+
+        # padded texture row of each screen row; everything outside the wall lands on the padding
+        step = TEXTURE_SIZE / proj_height
+        top = HALF_HEIGHT - proj_height // 2 - 1 / step
+        np.subtract(self.rows, top, out=self.texture_y)
+        np.multiply(self.texture_y, step, out=self.texture_y)
+        np.clip(self.texture_y, 0, TEXTURE_SIZE + 1, out=self.texture_y)
+        self.indices[:] = self.texture_y
+        np.add(self.indices, column_start, out=self.indices)
+        np.take(self.texture_pixels, self.indices, out=self.columns)
+
+        pixels = pg.surfarray.pixels2d(self.layer)
+        for i in range(SCALE):
+            pixels[i::SCALE] = self.columns.T
+        del pixels
+        self.screen.blit(self.layer, (0, 0))
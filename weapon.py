@@ -2,11 +2,11 @@ from spriteEntity import *
 
 # a subclass of AnimatedSprite and represents a weapon object in the game.
 class Weapon(spriteAnimator):
-    def __init__(self, game, path='resources/sprites/weapon/shotgun/0.png', scale=0.4, animation_time=90):
+    asset_category = 'weapon'
+    sprite_path = 'resources/sprites/weapon/shotgun/0.png'
+
+    def __init__(self, game, path=sprite_path, scale=0.4, animation_time=90):
         super().__init__(game=game, path=path, scale=scale, animation_time=animation_time) #Initializes the Weapon object by calling the parent class constructor (AnimatedSprite).
-        self.images = deque(
-            [pg.transform.smoothscale(img, (self.image.get_width() * scale, self.image.get_height() * scale))
-             for img in self.images]) #Creates a deque of images from the loaded image, and smoothscales each image based on the desired scale
         self.weapon_pos = (HALF_WIDTH - self.images[0].get_width() // 2+200 , HEIGHT - self.images[0].get_height())
         self.reloading = False
         self.num_images = len(self.images)
@@ -14,6 +14,13 @@ class Weapon(spriteAnimator):
         self.damage = 50
 
 
+    # Gets the frames from the asset registry smoothscaled to the weapon scale, based on the size of the first image
+    def get_images(self, path):
+        size = int(self.image.get_width() * self.SPRITE_SCALE), int(self.image.get_height() * self.SPRITE_SCALE)
+        images = self.game.assets.acquire_frames(path, self.asset_category, size, smooth=True)
+        self.assets.extend(images)
+        return deque(images)
+
     # Handles the animation of the weapon when the player shoots (left mouse click)
     def animate_shot(self):
         if self.reloading:
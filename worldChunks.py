@@ -0,0 +1,129 @@
+from settings import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# chunk states
+PAGED_OUT, RESIDENT, ACTIVE = 0, 1, 2
+
+
+# The map split into square chunks of CHUNK_SIZE tiles, so that the cost of a level follows the
+# area around the player rather than the size of the map. Chunks within CHUNK_ACTIVE_RADIUS chunks
+# of the player's chunk are active: their NPCs are simulated every tick. Chunks within
+# CHUNK_RESIDENT_RADIUS are resident: their path graph and sprites are loaded and their NPCs are
+# simulated coarsely, every CHUNK_COARSE_INTERVAL milliseconds. NPCs anywhere else are frozen.
+# When the player enters another chunk, the listeners (see add_listener) load the chunks that
+# became resident and unload the ones more than a ring beyond the resident radius, so walking
+# along a chunk border does not page the same chunks in and out.
+# With CHUNK_STREAMING off, or for code that needs the whole map (whole_map), every chunk is
+# active and resident all the time.
+class WorldChunks:
+    def __init__(self, game, whole_map=not CHUNK_STREAMING):
+        self.game = game
+        self.size = CHUNK_SIZE
+        self.cols = -(-game.map.cols // self.size)
+        self.rows = -(-game.map.rows // self.size)
+        self.whole_map = whole_map
+        self.states = bytearray(self.cols * self.rows)  # chunk state, indexed cy * cols + cx
+        self.resident = set()
+        self.listeners = []
+        self.center = None
+        self.time = 0
+        self.next_coarse = 0
+        self.coarse = True  # whether resident chunks are simulated this tick
+        self.version = 0  # bumped whenever chunks are loaded or unloaded
+        self.loads = self.unloads = 0
+        if whole_map:
+            self.states[:] = bytes([ACTIVE]) * len(self.states)
+            self.resident = {(cx, cy) for cy in range(self.rows) for cx in range(self.cols)}
+        else:
+            self.move(self.get_chunk(*game.player.map_pos))
+
+    def get_chunk(self, x, y):
+        return int(x) // self.size, int(y) // self.size
+
+    # Returns the tiles of a chunk as (left, top, right, bottom), right and bottom exclusive.
+    def get_bounds(self, chunk):
+        left, top = chunk[0] * self.size, chunk[1] * self.size
+        return left, top, min(left + self.size, self.game.map.cols), min(top + self.size, self.game.map.rows)
+
+    def is_resident(self, x, y):
+        return self.get_chunk(x, y) in self.resident
+
+    # Registers an object with load_chunk(chunk) and unload_chunk(chunk) methods, which are called
+    # for the resident chunks right away and then as chunks are paged in and out.
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+        for chunk in sorted(self.resident):
+            listener.load_chunk(chunk)
+
+    # Follows the player and decides whether resident chunks are simulated this tick.
+    def update(self):
+        self.time += self.game.delta_time
+        self.coarse = self.time >= self.next_coarse
+        if self.coarse:
+            self.next_coarse = self.time + CHUNK_COARSE_INTERVAL
+        if self.whole_map:
+            self.coarse = True
+            return
+        center = self.get_chunk(*self.game.player.map_pos)
+        if center != self.center:
+            with self.game.profiler.span('WorldChunks.move'):
+                self.move(center)
+
+    # Recomputes the chunk states around a new center chunk and pages chunks in and out.
+    def move(self, center):
+        self.center = center
+        cx, cy = center
+        wanted = set()
+        self.states[:] = bytes(len(self.states))
+        for y in range(max(cy - CHUNK_RESIDENT_RADIUS, 0), min(cy + CHUNK_RESIDENT_RADIUS + 1, self.rows)):
+            for x in range(max(cx - CHUNK_RESIDENT_RADIUS, 0), min(cx + CHUNK_RESIDENT_RADIUS + 1, self.cols)):
+                wanted.add((x, y))
+                near = abs(x - cx) <= CHUNK_ACTIVE_RADIUS and abs(y - cy) <= CHUNK_ACTIVE_RADIUS
+                self.states[y * self.cols + x] = ACTIVE if near else RESIDENT
+        # chunks up to a ring beyond the resident radius stay loaded, but their NPCs are frozen
+        unload = [chunk for chunk in self.resident
+                  if max(abs(chunk[0] - cx), abs(chunk[1] - cy)) > CHUNK_RESIDENT_RADIUS + 1]
+        load = sorted(wanted - self.resident)
+        for chunk in unload:
+            self.resident.discard(chunk)
+            for listener in self.listeners:
+                listener.unload_chunk(chunk)
+        for chunk in load:
+            self.resident.add(chunk)
+            for listener in self.listeners:
+                listener.load_chunk(chunk)
+        if load or unload:
+            self.version += 1
+            self.loads += len(load)
+            self.unloads += len(unload)
+
+    # Splits entities (with x and y attributes) into the ones simulated this tick (those in active
+    # chunks, and on coarse ticks also those in resident chunks) and the other resident ones.
+    def split(self, entities):
+        if self.whole_map:
+            return entities, []
+        states, size, cols = self.states, self.size, self.cols
+        lowest = RESIDENT if self.coarse else ACTIVE
+        simulated, resident = [], []
+        for entity in entities:
+            state = states[int(entity.y) // size * cols + int(entity.x) // size]
+            if state >= lowest:
+                simulated.append(entity)
+            elif state:
+                resident.append(entity)
+        return simulated, resident
+
+    # Batched split: returns which of the positions (x, y arrays) are simulated this tick.
+    def get_simulated_mask(self, x, y):
+        if self.whole_map:
+            return np.ones(len(x), bool)
+        states = np.frombuffer(self.states, np.uint8)
+        chunk = (y.astype(np.intp) // self.size) * self.cols + x.astype(np.intp) // self.size
+        return states[chunk] >= (RESIDENT if self.coarse else ACTIVE)
+
+    def stats(self):
+        return {'resident': len(self.resident), 'loads': self.loads, 'unloads': self.unloads}